@@ -6,6 +6,7 @@ Initiates voice calls via WhatsApp using Evolution API + LiveKit
 import asyncio
 import httpx
 import os
+import time
 from dotenv import load_dotenv
 from livekit import api
 import logging
@@ -38,7 +39,7 @@ async def create_livekit_room(phone: str) -> dict:
         Dict with room_name and token
     """
     try:
-        room_name = f"m4markets-{phone}-{int(asyncio.get_event_loop().time())}"
+        room_name = f"m4markets-{phone}-{int(time.time())}"
 
         # Create LiveKit API client
         lk_api = api.LiveKitAPI(
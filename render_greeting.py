@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Renderiza el saludo inicial de voice_agent_simple.py a WAV
+El WAV no se versiona: se genera en el deploy (o al cambiar el texto/voz) con
+    python render_greeting.py
+Sin el archivo, el agente deja que el modelo diga el saludo
+"""
+
+import asyncio
+import os
+
+from dotenv import load_dotenv
+from livekit.plugins import openai
+
+load_dotenv()
+
+from utils.greeting_cache import GREETING_AUDIO_PATH, CachedAudio, synthesize_audio, save_cached_audio
+from utils.prompts import load_prompt
+
+# Same voice name as the realtime model in voice_agent_simple.py
+GREETING_VOICE = os.getenv("GREETING_VOICE", "shimmer")
+
+
+async def main():
+    tts = openai.TTS(voice=GREETING_VOICE)
+    audio: CachedAudio = await synthesize_audio(tts, load_prompt("maicol_saludo.md"))
+    save_cached_audio(GREETING_AUDIO_PATH, audio)
+    print(f"✅ Saludo guardado en {GREETING_AUDIO_PATH} ({len(audio.pcm) / 2 / audio.sample_rate:.1f}s)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,76 @@
+"""
+Unit tests for utils/error_handler.py retry_with_backoff
+Ejecutar: python -m unittest test_error_handler
+"""
+
+import asyncio
+import unittest
+from unittest import mock
+
+from utils.error_handler import retry_with_backoff
+
+
+class SignallingError(Exception):
+    """Stands in for livekit.rtc.ConnectError (an Exception, not a ConnectionError)"""
+
+
+def flaky(failures, exc_type):
+    """Coroutine function that raises exc_type for the first `failures` calls"""
+    calls = []
+
+    async def connect():
+        calls.append(None)
+        if len(calls) <= failures:
+            raise exc_type("signalling dropped")
+        return "connected"
+
+    return connect, calls
+
+
+class RetryWithBackoffTest(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch("utils.error_handler.asyncio.sleep", new_callable=mock.AsyncMock)
+        self.sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_first_retry_of_listed_exception_skips_sleep(self):
+        connect, calls = flaky(1, SignallingError)
+        wrapped = retry_with_backoff(
+            max_retries=3, initial_delay=2.0, immediate_retry_exceptions=(SignallingError,)
+        )(connect)
+
+        self.assertEqual(asyncio.run(wrapped()), "connected")
+        self.assertEqual(len(calls), 2)
+        self.sleep.assert_not_awaited()
+
+    def test_later_retries_of_listed_exception_back_off(self):
+        connect, calls = flaky(3, SignallingError)
+        wrapped = retry_with_backoff(
+            max_retries=3, initial_delay=2.0, immediate_retry_exceptions=(SignallingError,)
+        )(connect)
+
+        self.assertEqual(asyncio.run(wrapped()), "connected")
+        self.assertEqual(len(calls), 4)
+        self.assertEqual([c.args[0] for c in self.sleep.await_args_list], [2.0, 4.0])
+
+    def test_unlisted_exception_sleeps_before_first_retry(self):
+        connect, calls = flaky(1, ValueError)
+        wrapped = retry_with_backoff(
+            max_retries=3, initial_delay=2.0, immediate_retry_exceptions=(SignallingError,)
+        )(connect)
+
+        self.assertEqual(asyncio.run(wrapped()), "connected")
+        self.sleep.assert_awaited_once_with(2.0)
+
+    def test_raises_after_max_retries(self):
+        connect, calls = flaky(10, SignallingError)
+        wrapped = retry_with_backoff(max_retries=2, initial_delay=1.0)(connect)
+
+        with self.assertRaises(SignallingError):
+            asyncio.run(wrapped())
+        self.assertEqual(len(calls), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,31 @@
+"""
+Unit tests for utils/model_router.py is_affirmation
+Ejecutar: python -m unittest test_model_router
+"""
+
+import importlib.util
+import unittest
+
+HAS_LIVEKIT = importlib.util.find_spec("livekit") is not None
+
+
+@unittest.skipUnless(HAS_LIVEKIT, "livekit-agents not installed")
+class IsAffirmationTest(unittest.TestCase):
+
+    def setUp(self):
+        from utils.model_router import is_affirmation
+        self.is_affirmation = is_affirmation
+
+    def test_catches_plain_acknowledgments(self):
+        for text in ("sí", "Sí", "¡Sí!", "si", "dale", "Dale.", "de una", "De una!", "  ok  ", "de acuerdo"):
+            with self.subTest(text=text):
+                self.assertTrue(self.is_affirmation(text))
+
+    def test_ignores_longer_turns(self):
+        for text in ("sí, pero tengo una duda", "dale que sí", "de una vez por todas", "sin problema", ""):
+            with self.subTest(text=text):
+                self.assertFalse(self.is_affirmation(text))
+
+
+if __name__ == "__main__":
+    unittest.main()
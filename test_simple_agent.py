@@ -0,0 +1,36 @@
+"""
+Unit tests for voice_agent_simple.py model setup
+Ejecutar: python -m unittest test_simple_agent
+"""
+
+import importlib.util
+import os
+import unittest
+
+HAS_OPENAI_PLUGIN = importlib.util.find_spec("livekit") is not None and \
+    importlib.util.find_spec("livekit.plugins.openai") is not None
+
+
+@unittest.skipUnless(HAS_OPENAI_PLUGIN, "livekit-plugins-openai not installed")
+class BuildRealtimeModelTest(unittest.TestCase):
+
+    def setUp(self):
+        os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+    def test_builds_with_output_token_cap(self):
+        import voice_agent_simple
+        from livekit.plugins import openai
+
+        model = voice_agent_simple.build_realtime_model()
+        self.assertIsInstance(model, openai.realtime.RealtimeModel)
+        self.assertEqual(model._opts.max_response_output_tokens, voice_agent_simple.MAX_RESPONSE_TOKENS)
+
+    def test_instructions_carry_the_opener_once(self):
+        import voice_agent_simple
+
+        self.assertNotIn("{saludo}", voice_agent_simple._INSTRUCTIONS)
+        self.assertEqual(voice_agent_simple._INSTRUCTIONS.count(voice_agent_simple.GREETING_TEXT), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
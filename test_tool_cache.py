@@ -0,0 +1,126 @@
+"""
+Unit tests for utils/tool_cache.py
+Ejecutar: python -m unittest test_tool_cache
+"""
+
+import asyncio
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from utils.tool_cache import UncachedResult, cache_tool_result, normalize_query
+
+
+class FakeClock:
+    """Stands in for the time module inside utils.tool_cache"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+def make_tool(ttl=60, max_entries=512):
+    """Cached tool that counts how many times it actually runs"""
+    calls = []
+
+    @cache_tool_result(ttl=ttl, max_entries=max_entries)
+    async def tool(query, category=None):
+        calls.append((query, category))
+        return f"answer {len(calls)}"
+
+    return tool, calls
+
+
+class NormalizeQueryTest(unittest.TestCase):
+
+    def test_case_accents_and_punctuation(self):
+        self.assertEqual(normalize_query("¿Qué es el Spread?"), "que es el spread")
+
+    def test_collapses_whitespace(self):
+        self.assertEqual(normalize_query("  tipos   de\tcuenta "), "tipos de cuenta")
+
+    def test_none_is_empty(self):
+        self.assertEqual(normalize_query(None), "")
+
+    def test_lists_ignore_order(self):
+        self.assertEqual(
+            normalize_query(["Premium", "Standard"]),
+            normalize_query(["standard", "premium"]),
+        )
+
+    def test_non_string_values(self):
+        self.assertEqual(normalize_query(1000), "1000")
+
+
+class CacheToolResultTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch("utils.tool_cache.time", SimpleNamespace(monotonic=self.clock.monotonic))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_hit_on_normalized_query(self):
+        tool, calls = make_tool()
+        first = asyncio.run(tool("¿Qué es el spread?"))
+        second = asyncio.run(tool("que es el SPREAD"))
+        self.assertEqual(first, second)
+        self.assertEqual(len(calls), 1)
+
+    def test_kwargs_are_part_of_the_key(self):
+        tool, calls = make_tool()
+        asyncio.run(tool("spreads", category="products"))
+        asyncio.run(tool("spreads", category="regulation"))
+        self.assertEqual(len(calls), 2)
+
+    def test_expires_after_ttl(self):
+        tool, calls = make_tool(ttl=60)
+        asyncio.run(tool("spread"))
+        self.clock.now += 59
+        asyncio.run(tool("spread"))
+        self.assertEqual(len(calls), 1)
+
+        self.clock.now += 1
+        self.assertEqual(asyncio.run(tool("spread")), "answer 2")
+        self.assertEqual(len(calls), 2)
+
+    def test_evicts_oldest_beyond_max_entries(self):
+        tool, calls = make_tool(max_entries=2)
+        asyncio.run(tool("a"))
+        asyncio.run(tool("b"))
+        asyncio.run(tool("c"))  # evicts "a"
+
+        asyncio.run(tool("b"))
+        asyncio.run(tool("c"))
+        self.assertEqual(len(calls), 3)
+
+        asyncio.run(tool("a"))
+        self.assertEqual(len(calls), 4)
+
+    def test_uncached_result_is_not_stored(self):
+        calls = []
+
+        @cache_tool_result(ttl=60)
+        async def flaky(query):
+            calls.append(query)
+            if len(calls) == 1:
+                return UncachedResult("No pude obtener información")
+            return "ok"
+
+        self.assertEqual(asyncio.run(flaky("spread")), "No pude obtener información")
+        self.assertEqual(asyncio.run(flaky("spread")), "ok")
+        self.assertEqual(asyncio.run(flaky("spread")), "ok")
+        self.assertEqual(len(calls), 2)
+
+    def test_cache_clear(self):
+        tool, calls = make_tool()
+        asyncio.run(tool("spread"))
+        tool.cache_clear()
+        asyncio.run(tool("spread"))
+        self.assertEqual(len(calls), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
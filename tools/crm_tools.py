@@ -3,24 +3,306 @@ CRM Tools for M4Markets Voice Agent
 Manages leads, conversations, and callbacks in Neon PostgreSQL
 """
 
+import asyncio
 import asyncpg
+import hashlib
 import os
+import re
 from datetime import datetime
-from typing import Dict, Optional, List
+from pathlib import Path
+from typing import Dict, Optional, List, Tuple
 import logging
 from livekit.agents import function_tool
+from utils.error_handler import retry_with_backoff
+from utils import fast_json
 
 logger = logging.getLogger(__name__)
 
 # Database connection
 DB_URL = os.getenv("DB_URL")
 
+# Note batches that still fail after retries are appended here (JSON lines)
+# for replay, instead of putting lead phones and note text in the logs
+FAILED_NOTES_PATH = Path(os.getenv("FAILED_NOTES_PATH", "cache/failed_notes.jsonl"))
+
 
 async def get_db_connection():
     """Create database connection"""
     return await asyncpg.connect(DB_URL)
 
 
+# Shared pool for background writes, created on first use in the job's loop
+_db_pool: Optional[asyncpg.Pool] = None
+_db_pool_lock = asyncio.Lock()
+
+
+async def get_db_pool() -> asyncpg.Pool:
+    """Get (or create) the process-wide connection pool"""
+    global _db_pool
+    async with _db_pool_lock:
+        if _db_pool is None:
+            _db_pool = await asyncpg.create_pool(DB_URL, min_size=1, max_size=5)
+    return _db_pool
+
+
+async def close_db_pool():
+    """Close the connection pool (after note_writer.flush, see flush_notes_and_close_pool)"""
+    global _db_pool
+    async with _db_pool_lock:
+        pool, _db_pool = _db_pool, None
+    if pool is not None:
+        await pool.close()
+
+
+class NoteWriter:
+    """
+    Batches conversation notes and writes them on a background task
+    so save_conversation_note() never waits on the database
+    """
+
+    def __init__(self, batch_size: int = 20, max_delay: float = 0.5, max_pending: int = 256):
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._batch: List[Tuple[str, str, str]] = []  # being written right now
+
+    def submit(self, phone: str, note_type: str, content: str) -> bool:
+        """Queue a note; returns False if the queue is full"""
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_pending)
+            self._worker = asyncio.create_task(self._drain())
+
+        try:
+            self._queue.put_nowait((phone, note_type, content))
+            return True
+        except asyncio.QueueFull:
+            logger.error(f"Note queue full ({self.max_pending}), dropping {note_type} note")
+            return False
+
+    async def _drain(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Collect up to batch_size notes or max_delay worth, whichever first
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            self._batch = batch
+            try:
+                await self._write_batch(batch)
+            except Exception as e:
+                # Retries exhausted - keep the notes in the replay file
+                self._batch = []
+                await self._keep_for_replay(batch, e)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            self._batch = []
+
+    async def _keep_for_replay(self, batch: List[Tuple[str, str, str]], reason):
+        """Append unsaved notes to FAILED_NOTES_PATH; only counts and hashed leads are logged"""
+        leads = ", ".join(sorted({_lead_ref(note[0]) for note in batch}))
+        logger.error(f"Error saving {len(batch)} notes (leads {leads}): {reason}")
+        try:
+            await asyncio.to_thread(_save_failed_notes, batch)
+            logger.error(f"Saved {len(batch)} unsaved notes to {FAILED_NOTES_PATH} for replay")
+        except Exception as save_error:
+            logger.error(f"Could not save {len(batch)} notes for replay, dropping them: {save_error}")
+
+    @retry_with_backoff(max_retries=3, initial_delay=0.5, max_delay=4.0)
+    async def _write_batch(self, batch: List[Tuple[str, str, str]]):
+        pool = await get_db_pool()
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                # Get or create each lead once per batch
+                lead_ids = {}
+                for phone in {note[0] for note in batch}:
+                    lead_id = await conn.fetchval("SELECT id FROM leads WHERE phone = $1", phone)
+                    if not lead_id:
+                        lead_id = await conn.fetchval("""
+                            INSERT INTO leads (phone, status, source, created_at)
+                            VALUES ($1, 'new', 'voice_call', NOW())
+                            RETURNING id
+                        """, phone)
+                    lead_ids[phone] = lead_id
+
+                await conn.executemany("""
+                    INSERT INTO conversation_notes (lead_id, note_type, content, created_at)
+                    VALUES ($1, $2, $3, NOW())
+                """, [(lead_ids[phone], note_type, content) for phone, note_type, content in batch])
+
+        logger.info(f"💾 Saved {len(batch)} conversation notes")
+
+    async def flush(self, timeout: float = 5.0):
+        """Wait for queued notes to be written (bounded by timeout)"""
+        if self._queue is None:
+            return
+
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ Note flush timed out with {self._queue.qsize()} pending notes")
+
+    async def stop(self):
+        """
+        Stop the background writer so nothing touches the pool afterwards
+        Notes it hadn't written yet go to the replay file
+        """
+        if self._worker is None:
+            return
+
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+
+        unsaved = list(self._batch)
+        while not self._queue.empty():
+            unsaved.append(self._queue.get_nowait())
+            self._queue.task_done()
+        self._queue = self._worker = None
+        self._batch = []
+
+        if unsaved:
+            await self._keep_for_replay(unsaved, "writer stopped at shutdown")
+
+
+# Global note writer instance
+note_writer = NoteWriter()
+
+
+def _lead_ref(phone: str) -> str:
+    """Short, stable hash of a lead phone, for logs"""
+    return hashlib.blake2b(phone.encode("utf-8"), digest_size=4).hexdigest()
+
+
+def _save_failed_notes(batch: List[Tuple[str, str, str]]):
+    """Append notes that couldn't be written to FAILED_NOTES_PATH"""
+    FAILED_NOTES_PATH.parent.mkdir(parents=True, exist_ok=True)
+    failed_at = datetime.now().isoformat()
+    with FAILED_NOTES_PATH.open("a", encoding="utf-8") as f:
+        for phone, note_type, content in batch:
+            f.write(fast_json.dumps({
+                "phone": phone,
+                "note_type": note_type,
+                "content": content,
+                "failed_at": failed_at,
+            }) + "\n")
+
+
+async def flush_notes_and_close_pool(_reason: str = ""):
+    """
+    Job shutdown callback: write pending notes, then close the pool
+    One callback because LiveKit runs shutdown callbacks concurrently; the
+    writer is stopped first so a late batch can't reopen the pool
+    """
+    await note_writer.flush()
+    await note_writer.stop()
+    await close_db_pool()
+
+
+# Lead scoring tables (built once at import)
+# Capital thresholds in USD, highest first -> points (40 max)
+CAPITAL_SCORES = ((5000, 40), (1000, 30), (200, 20), (5, 10))
+
+# Keyword -> points, checked in order (20 max each)
+EXPERIENCE_SCORES = (("avanzado", 20), ("intermedio", 15), ("principiante", 10))
+URGENCY_SCORES = (("alta", 20), ("urgente", 20), ("media", 10), ("baja", 5))
+
+# Minimum score -> (qualification, recommended action), highest first
+QUALIFICATION_TIERS = (
+    (70, "HOT", "immediate_handoff"),
+    (40, "WARM", "schedule_callback"),
+    (0, "COLD", "whatsapp_followup"),
+)
+
+
+def _keyword_score(value: Optional[str], table: tuple) -> int:
+    """Points for the first keyword in the table contained in value"""
+    if not value:
+        return 0
+
+    value_lower = value.lower()
+    for keyword, points in table:
+        if keyword in value_lower:
+            return points
+    return 0
+
+
+def calculate_lead_score(
+    capital_available: Optional[int] = None,
+    trading_experience: Optional[str] = None,
+    urgency: Optional[str] = None,
+    pain_points: Optional[List[str]] = None
+) -> Tuple[int, str, str]:
+    """
+    Calculate the 0-100 qualification score for a lead
+
+    Returns:
+        (score, qualification, recommended_action)
+    """
+    score = 0
+
+    # Capital scoring (40 points max)
+    if capital_available:
+        for threshold, points in CAPITAL_SCORES:
+            if capital_available >= threshold:
+                score += points
+                break
+
+    # Experience and urgency scoring (20 points max each)
+    score += _keyword_score(trading_experience, EXPERIENCE_SCORES)
+    score += _keyword_score(urgency, URGENCY_SCORES)
+
+    # Pain points scoring (20 points max)
+    if pain_points and len(pain_points) >= 3:
+        score += 20
+    elif pain_points:
+        score += 10
+
+    for min_score, qualification, recommended_action in QUALIFICATION_TIERS:
+        if score >= min_score:
+            return score, qualification, recommended_action
+
+
+# Lead history lookups started before the LLM asks for them, keyed by phone digits
+_history_prefetch: Dict[str, asyncio.Task] = {}
+
+
+def _phone_key(phone: str) -> str:
+    return re.sub(r"\D", "", phone or "")
+
+
+def prefetch_lead_history(phone: str):
+    """
+    Start loading a lead's history in the background
+
+    Called as soon as the phone is known so the DB round-trip overlaps with
+    the participant joining and the greeting; get_lead_history() then returns
+    the already-loaded result.
+    """
+    key = _phone_key(phone)
+    if key and key not in _history_prefetch:
+        _history_prefetch[key] = asyncio.create_task(fetch_lead_history(phone))
+
+
+async def discard_lead_history_prefetch(phone: str):
+    """Drop a prefetched lookup that was never used (job shutdown callback)"""
+    task = _history_prefetch.pop(_phone_key(phone), None)
+    if task:
+        task.cancel()
+
+
 @function_tool
 async def get_lead_history(phone: str) -> Dict:
     """
@@ -32,6 +314,14 @@ async def get_lead_history(phone: str) -> Dict:
     Returns:
         Dict with lead information, previous conversations, and notes
     """
+    task = _history_prefetch.pop(_phone_key(phone), None)
+    if task:
+        return await task
+    return await fetch_lead_history(phone)
+
+
+async def fetch_lead_history(phone: str) -> Dict:
+    """Query the lead, its recent conversations and notes"""
     try:
         conn = await get_db_connection()
 
@@ -116,46 +406,23 @@ async def save_conversation_note(
         content: Note content
 
     Returns:
-        Success status
+        Queued status (the note is written in the background)
     """
-    try:
-        conn = await get_db_connection()
-
-        # Get or create lead
-        lead = await conn.fetchrow("SELECT id FROM leads WHERE phone = $1", phone)
-
-        if not lead:
-            # Create basic lead record
-            lead_id = await conn.fetchval("""
-                INSERT INTO leads (phone, status, source, created_at)
-                VALUES ($1, 'new', 'voice_call', NOW())
-                RETURNING id
-            """, phone)
-        else:
-            lead_id = lead['id']
-
-        # Insert note
-        await conn.execute("""
-            INSERT INTO conversation_notes (lead_id, note_type, content, created_at)
-            VALUES ($1, $2, $3, NOW())
-        """, lead_id, note_type, content)
-
-        await conn.close()
-
-        return {
-            "success": True,
-            "lead_id": str(lead_id),
-            "note_type": note_type,
-            "message": f"Nota guardada: {note_type}"
-        }
-
-    except Exception as e:
-        logger.error(f"Error saving note: {e}")
+    # Written in the background so the next turn doesn't wait on the DB. The
+    # lead may only be created by that write, so no lead_id is returned here.
+    if not note_writer.submit(phone, note_type, content):
         return {
             "success": False,
-            "error": str(e)
+            "error": "note queue full"
         }
 
+    return {
+        "success": True,
+        "queued": True,
+        "note_type": note_type,
+        "message": f"Nota registrada: {note_type}"
+    }
+
 
 @function_tool
 async def qualify_and_save_lead(
@@ -191,56 +458,9 @@ async def qualify_and_save_lead(
     try:
         conn = await get_db_connection()
 
-        # Calculate qualification score (0-100)
-        score = 0
-
-        # Capital scoring (40 points max)
-        if capital_available:
-            if capital_available >= 5000:
-                score += 40
-            elif capital_available >= 1000:
-                score += 30
-            elif capital_available >= 200:
-                score += 20
-            elif capital_available >= 5:
-                score += 10
-
-        # Experience scoring (20 points max)
-        if trading_experience:
-            exp_lower = trading_experience.lower()
-            if "avanzado" in exp_lower:
-                score += 20
-            elif "intermedio" in exp_lower:
-                score += 15
-            elif "principiante" in exp_lower:
-                score += 10
-
-        # Urgency scoring (20 points max)
-        if urgency:
-            urg_lower = urgency.lower()
-            if "alta" in urg_lower or "urgente" in urg_lower:
-                score += 20
-            elif "media" in urg_lower:
-                score += 10
-            elif "baja" in urg_lower:
-                score += 5
-
-        # Pain points scoring (20 points max)
-        if pain_points and len(pain_points) >= 3:
-            score += 20
-        elif pain_points and len(pain_points) >= 1:
-            score += 10
-
-        # Determine qualification
-        if score >= 70:
-            qualification = "HOT"
-            recommended_action = "immediate_handoff"
-        elif score >= 40:
-            qualification = "WARM"
-            recommended_action = "schedule_callback"
-        else:
-            qualification = "COLD"
-            recommended_action = "whatsapp_followup"
+        score, qualification, recommended_action = calculate_lead_score(
+            capital_available, trading_experience, urgency, pain_points
+        )
 
         # Upsert lead
         lead_id = await conn.fetchval("""
@@ -360,8 +580,14 @@ async def schedule_callback(
 
 
 __all__ = [
+    'calculate_lead_score',
     'get_lead_history',
+    'prefetch_lead_history',
+    'discard_lead_history_prefetch',
     'save_conversation_note',
+    'note_writer',
+    'close_db_pool',
+    'flush_notes_and_close_pool',
     'qualify_and_save_lead',
     'schedule_callback'
 ]
@@ -6,6 +6,7 @@ Provides trading-related utilities and information
 from typing import Dict, Optional, List
 import logging
 from livekit.agents import function_tool
+from utils.tool_cache import cache_tool_result
 
 logger = logging.getLogger(__name__)
 
@@ -195,6 +196,7 @@ def _cost_recommendation(account_type: str, trades_per_month: int) -> str:
 
 
 @function_tool
+@cache_tool_result(ttl=3600)
 async def explain_forex_concept(concept: str) -> str:
     """
     Explain forex/trading concepts in simple Spanish
@@ -9,6 +9,7 @@ from pathlib import Path
 from typing import Dict, List, Optional
 import logging
 from livekit.agents import function_tool
+from utils.tool_cache import UncachedResult, cache_tool_result
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -89,6 +90,7 @@ class M4MarketsKnowledgeBase:
 
 # Function tools for LiveKit agent
 @function_tool
+@cache_tool_result(ttl=3600)
 async def query_m4markets_knowledge(query: str, category: Optional[str] = None) -> str:
     """
     Query M4Markets knowledge base for information
@@ -172,10 +174,11 @@ async def query_m4markets_knowledge(query: str, category: Optional[str] = None)
 
     except Exception as e:
         logger.error(f"Error in query_m4markets_knowledge: {e}")
-        return f"No pude obtener información específica sobre '{query}'. ¿Podrías reformular la pregunta?"
+        return UncachedResult(f"No pude obtener información específica sobre '{query}'. ¿Podrías reformular la pregunta?")
 
 
 @function_tool
+@cache_tool_result(ttl=3600)
 async def get_account_comparison(account_types: List[str] = None) -> str:
     """
     Compare different M4Markets account types
@@ -205,6 +208,7 @@ async def get_account_comparison(account_types: List[str] = None) -> str:
 
 
 @function_tool
+@cache_tool_result(ttl=3600)
 async def get_regulation_info(region: Optional[str] = None) -> str:
     """
     Get regulatory information for M4Markets
@@ -128,7 +128,8 @@ def retry_with_backoff(
     initial_delay: float = 1.0,
     max_delay: float = 60.0,
     backoff_factor: float = 2.0,
-    exceptions: tuple = (Exception,)
+    exceptions: tuple = (Exception,),
+    immediate_retry_exceptions: tuple = ()
 ):
     """
     Decorator for retry with exponential backoff
@@ -139,6 +140,7 @@ def retry_with_backoff(
         max_delay: Maximum delay between retries (seconds)
         backoff_factor: Multiplier for delay after each retry
         exceptions: Tuple of exceptions to catch and retry
+        immediate_retry_exceptions: Exceptions whose first retry skips the delay
     """
 
     def decorator(func):
@@ -160,6 +162,13 @@ def retry_with_backoff(
                         )
                         raise
 
+                    if attempt == 0 and isinstance(e, immediate_retry_exceptions):
+                        logger.warning(
+                            f"Function {func.__name__} failed (attempt 1/{max_retries}): {str(e)}. "
+                            f"Retrying immediately..."
+                        )
+                        continue
+
                     logger.warning(
                         f"Function {func.__name__} failed (attempt {attempt + 1}/{max_retries}): {str(e)}. "
                         f"Retrying in {delay:.1f}s..."
@@ -189,6 +198,13 @@ def retry_with_backoff(
                         )
                         raise
 
+                    if attempt == 0 and isinstance(e, immediate_retry_exceptions):
+                        logger.warning(
+                            f"Function {func.__name__} failed (attempt 1/{max_retries}): {str(e)}. "
+                            f"Retrying immediately..."
+                        )
+                        continue
+
                     logger.warning(
                         f"Function {func.__name__} failed (attempt {attempt + 1}/{max_retries}): {str(e)}. "
                         f"Retrying in {delay:.1f}s..."
@@ -0,0 +1,29 @@
+"""
+Fast JSON helpers for M4Markets Voice Agent
+Uses orjson when installed and falls back to the stdlib json module
+"""
+
+try:
+    import orjson
+
+    def dumps(obj) -> str:
+        """Serialize obj to a JSON string"""
+        return orjson.dumps(obj, default=str).decode("utf-8")
+
+    def loads(data):
+        """Parse a JSON str or bytes payload"""
+        return orjson.loads(data)
+
+except ImportError:  # pragma: no cover - orjson is optional
+    import json
+
+    def dumps(obj) -> str:
+        """Serialize obj to a JSON string"""
+        return json.dumps(obj, default=str)
+
+    def loads(data):
+        """Parse a JSON str or bytes payload"""
+        return json.loads(data)
+
+
+__all__ = ["dumps", "loads"]
@@ -0,0 +1,110 @@
+"""
+Greeting Audio Cache for M4Markets Voice Agent
+Stores the synthesized opening greeting as WAV so calls can play it without
+an LLM + TTS round-trip before the user hears anything
+"""
+
+import hashlib
+import logging
+import os
+import wave
+from dataclasses import dataclass
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+from livekit import rtc
+
+logger = logging.getLogger("m4markets-agent.greeting_cache")
+
+GREETING_CACHE_DIR = Path(os.getenv("GREETING_CACHE_DIR", "cache/greetings"))
+
+# Opener of voice_agent_simple.py, pre-rendered by render_greeting.py. Not
+# committed: render it at deploy time (needs OPENAI_API_KEY); without it the
+# simple agent has the model speak the opener instead.
+GREETING_AUDIO_PATH = Path(os.getenv("GREETING_AUDIO_PATH", "assets/greeting_maicol.wav"))
+
+# Frame size used when replaying cached audio into the room
+FRAME_MS = 20
+
+
+@dataclass
+class CachedAudio:
+    """16-bit PCM audio held in memory"""
+    pcm: bytes
+    sample_rate: int
+    num_channels: int
+
+
+def greeting_cache_path(text: str, *voice_params) -> Path:
+    """
+    Cache file for a greeting text synthesized with the given voice settings
+
+    Args:
+        text: Greeting text
+        *voice_params: Anything that changes the audio (provider, voice, speed...)
+    """
+    key = "|".join([text, *map(str, voice_params)])
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).hexdigest()
+    return GREETING_CACHE_DIR / f"greeting_{digest}.wav"
+
+
+def load_cached_audio(path: Path) -> Optional[CachedAudio]:
+    """Load a cached WAV file, or None if it doesn't exist or can't be read"""
+    if not path.exists():
+        return None
+
+    try:
+        with wave.open(str(path), "rb") as wav:
+            return CachedAudio(
+                pcm=wav.readframes(wav.getnframes()),
+                sample_rate=wav.getframerate(),
+                num_channels=wav.getnchannels(),
+            )
+    except (wave.Error, OSError) as e:
+        logger.warning(f"⚠️ Could not read cached greeting {path}: {str(e)}")
+        return None
+
+
+def save_cached_audio(path: Path, audio: CachedAudio):
+    """Write audio to the cache atomically (safe with concurrent workers)"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+
+    with wave.open(str(tmp_path), "wb") as wav:
+        wav.setnchannels(audio.num_channels)
+        wav.setsampwidth(2)
+        wav.setframerate(audio.sample_rate)
+        wav.writeframes(audio.pcm)
+
+    os.replace(tmp_path, path)
+    logger.info(f"💾 Greeting audio cached: {path}")
+
+
+async def synthesize_audio(tts, text: str) -> CachedAudio:
+    """Synthesize text with a LiveKit TTS plugin and collect the full audio"""
+    frames = []
+    async with tts.synthesize(text) as stream:
+        async for event in stream:
+            frames.append(event.frame)
+
+    merged = rtc.combine_audio_frames(frames)
+    return CachedAudio(
+        pcm=merged.data.tobytes(),
+        sample_rate=merged.sample_rate,
+        num_channels=merged.num_channels,
+    )
+
+
+async def iter_audio_frames(audio: CachedAudio) -> AsyncIterator[rtc.AudioFrame]:
+    """Replay cached audio as FRAME_MS frames (for AgentSession.say(audio=...))"""
+    bytes_per_sample = 2 * audio.num_channels
+    bytes_per_frame = audio.sample_rate * FRAME_MS // 1000 * bytes_per_sample
+
+    for offset in range(0, len(audio.pcm), bytes_per_frame):
+        chunk = audio.pcm[offset:offset + bytes_per_frame]
+        yield rtc.AudioFrame(
+            data=chunk,
+            sample_rate=audio.sample_rate,
+            num_channels=audio.num_channels,
+            samples_per_channel=len(chunk) // bytes_per_sample,
+        )
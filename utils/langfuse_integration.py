@@ -3,10 +3,11 @@ Langfuse Integration for M4Markets Voice Agent
 Comprehensive observability and cost tracking with Langfuse
 """
 
+import asyncio
 import os
 import time
 import logging
-from typing import Dict, Optional, List
+from typing import Callable, Dict, Optional, List
 from langfuse import Langfuse
 from contextlib import contextmanager
 
@@ -253,6 +254,48 @@ class VoiceCallTracer:
             logger.error(f"Error ending trace: {str(e)}")
 
 
+class TraceWriter:
+    """
+    Runs tracer calls on a background task so tracing never blocks the agent
+    Calls are executed in submission order in a worker thread
+    """
+
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    def submit(self, func: Callable, *args, **kwargs):
+        """Queue a tracer call (e.g. tracer.end_trace) without waiting for it"""
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._drain())
+        self._queue.put_nowait((func, args, kwargs))
+
+    async def _drain(self):
+        while True:
+            func, args, kwargs = await self._queue.get()
+            try:
+                await asyncio.to_thread(func, *args, **kwargs)
+            except Exception as e:
+                logger.error(f"Error writing Langfuse trace: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    async def flush(self, timeout: float = 5.0):
+        """Wait for queued tracer calls to finish (bounded by timeout)"""
+        if self._queue is None:
+            return
+
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ Langfuse flush timed out with {self._queue.qsize()} pending writes")
+
+
+# Global trace writer instance
+trace_writer = TraceWriter()
+
+
 # Context manager for tool tracking
 @contextmanager
 def track_tool_execution(tracer: VoiceCallTracer, tool_name: str, input_params: Dict):
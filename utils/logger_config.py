@@ -7,7 +7,8 @@ import logging
 import os
 from logging.handlers import RotatingFileHandler, TimedRotatingFileHandler
 from datetime import datetime
-import json
+
+from utils import fast_json
 
 
 class StructuredFormatter(logging.Formatter):
@@ -36,7 +37,7 @@ class StructuredFormatter(logging.Formatter):
         if hasattr(record, "duration"):
             log_data["duration_seconds"] = record.duration
 
-        return json.dumps(log_data)
+        return fast_json.dumps(log_data)
 
 
 class SimpleFormatter(logging.Formatter):
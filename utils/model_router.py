@@ -0,0 +1,83 @@
+"""
+LLM Model Router for M4Markets Voice Agent
+Sends short/trivial user turns to a faster model and everything else to the main model
+"""
+
+import logging
+import re
+from typing import Optional
+
+from livekit.agents import llm
+
+from utils.tool_cache import normalize_query
+
+logger = logging.getLogger("m4markets-agent.model_router")
+
+# Acknowledgments that never need the main model's reasoning, matched against
+# the normalized turn (lowercase, no accents, punctuation or extra spaces)
+AFFIRMATION_PATTERN = re.compile(
+    r"si|no|ok|okay|dale|claro|bueno|listo|perfecto|genial|gracias|de acuerdo|de una"
+)
+
+
+def is_affirmation(text: str) -> bool:
+    """True if the whole turn is a plain acknowledgment ("¡Sí!", "dale", "de una")"""
+    return AFFIRMATION_PATTERN.fullmatch(normalize_query(text)) is not None
+
+
+def last_user_text(chat_ctx: llm.ChatContext) -> Optional[str]:
+    """
+    Text of the last item if it is a user message
+    Returns None when the turn follows anything else (e.g. a tool result)
+    """
+    if not chat_ctx.items:
+        return None
+
+    item = chat_ctx.items[-1]
+    if item.type != "message" or item.role != "user":
+        return None
+    return item.text_content or ""
+
+
+class ModelRouter(llm.LLM):
+    """
+    LLM that picks a backend per turn by complexity
+
+    Short turns (fewer than ``max_words`` words) and plain affirmations go to
+    the fast model; SPIN reasoning, objections and turns after tool results go
+    to the main model.
+    """
+
+    def __init__(self, main: llm.LLM, fast: llm.LLM, max_words: int = 8):
+        super().__init__()
+        self._main = main
+        self._fast = fast
+        self._max_words = max_words
+
+        # Surface the backends' metrics/errors as this LLM's own
+        for backend in (main, fast):
+            backend.on("metrics_collected", lambda metrics: self.emit("metrics_collected", metrics))
+            backend.on("error", lambda error: self.emit("error", error))
+
+    @property
+    def model(self) -> str:
+        return self._main.model
+
+    def select(self, chat_ctx: llm.ChatContext) -> llm.LLM:
+        """Choose the backend for the next reply"""
+        text = last_user_text(chat_ctx)
+        if text is None:
+            return self._main
+
+        if len(text.split()) < self._max_words or is_affirmation(text):
+            return self._fast
+        return self._main
+
+    def chat(self, *, chat_ctx: llm.ChatContext, tools=None, **kwargs) -> llm.LLMStream:
+        backend = self.select(chat_ctx)
+        logger.debug("🔀 Routing turn to %s", backend.model)
+        return backend.chat(chat_ctx=chat_ctx, tools=tools, **kwargs)
+
+    async def aclose(self):
+        await self._main.aclose()
+        await self._fast.aclose()
@@ -0,0 +1,172 @@
+"""
+Shared OpenAI clients for M4Markets Voice Agent
+Bounds concurrent OpenAI requests per stage (STT / LLM / TTS) so bursts of
+calls queue locally instead of cascading into connection errors and retries.
+All stages share one HTTP/2 connection pool, so requests multiplex over the
+same TLS connection instead of each stage handshaking its own.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Optional
+
+import httpx
+import openai
+
+try:
+    import h2  # noqa: F401 - required by httpx for HTTP/2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+logger = logging.getLogger("m4markets-agent.openai_clients")
+
+# Waits longer than this are logged so the limits can be tuned
+SLOW_WAIT_THRESHOLD = 0.05
+
+# Max in-flight requests per stage, tuned to the account's rate-limit headroom
+STAGE_CONCURRENCY = {
+    "llm": int(os.getenv("OAI_LLM_CONCURRENCY", "8")),
+    "stt": int(os.getenv("OAI_STT_CONCURRENCY", "8")),
+    "tts": int(os.getenv("OAI_TTS_CONCURRENCY", "8")),
+}
+
+# HTTP/2 to api.openai.com (falls back to HTTP/1.1 if h2 isn't installed)
+HTTP2_ENABLED = os.getenv("OAI_HTTP2", "1") == "1" and HTTP2_AVAILABLE
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """Response body wrapper that frees the concurrency slot once the body is closed"""
+
+    def __init__(self, stream: httpx.AsyncByteStream, semaphore: asyncio.Semaphore):
+        self._stream = stream
+        self._semaphore = semaphore
+        self._released = False
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            if not self._released:
+                self._released = True
+                self._semaphore.release()
+
+
+class ConcurrencyLimitedTransport(httpx.AsyncBaseTransport):
+    """
+    httpx transport that caps in-flight requests with a semaphore
+
+    The slot is held until the response body is closed, so streamed LLM
+    completions and TTS audio count against the limit for their full duration.
+    """
+
+    def __init__(self, name: str, limit: int, transport: httpx.AsyncBaseTransport = None):
+        self.name = name
+        self.limit = limit
+        self._semaphore = asyncio.Semaphore(limit)
+        # A transport passed in is shared with other stages and not closed here
+        self._owns_transport = transport is None
+        self._transport = transport or httpx.AsyncHTTPTransport()
+
+        # Wait-time stats, used to tune the limit
+        self.requests = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _record_wait(self, waited: float):
+        self.requests += 1
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+
+        if waited >= SLOW_WAIT_THRESHOLD:
+            logger.info(
+                f"⏳ OpenAI {self.name} request waited {waited:.3f}s for a slot "
+                f"(limit={self.limit})"
+            )
+
+    def get_stats(self) -> Dict:
+        """Get semaphore wait statistics"""
+        return {
+            "stage": self.name,
+            "limit": self.limit,
+            "requests": self.requests,
+            "avg_wait": round(self.total_wait / self.requests, 4) if self.requests else 0,
+            "max_wait": round(self.max_wait, 4),
+        }
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        start_time = time.perf_counter()
+        await self._semaphore.acquire()
+        self._record_wait(time.perf_counter() - start_time)
+
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            self._semaphore.release()
+            raise
+
+        response.stream = _ReleasingStream(response.stream, self._semaphore)
+        return response
+
+    async def aclose(self):
+        if self._owns_transport:
+            await self._transport.aclose()
+
+
+# Connection pool shared by all stages. It lives as long as the process and
+# its connections are released when the process exits.
+_shared_transport: Optional[httpx.AsyncHTTPTransport] = None
+
+# One limited transport per stage, shared by every session in the process
+_transports: Dict[str, ConcurrencyLimitedTransport] = {}
+
+
+def get_shared_transport() -> httpx.AsyncHTTPTransport:
+    """Get (or create) the process-wide OpenAI connection pool"""
+    global _shared_transport
+    if _shared_transport is None:
+        _shared_transport = httpx.AsyncHTTPTransport(
+            http2=HTTP2_ENABLED,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=100),
+        )
+        logger.info(f"🔗 OpenAI connection pool created (HTTP/2: {HTTP2_ENABLED})")
+    return _shared_transport
+
+
+def get_stage_transport(stage: str) -> ConcurrencyLimitedTransport:
+    """Get (or create) the concurrency-limited transport for a stage"""
+    if stage not in _transports:
+        _transports[stage] = ConcurrencyLimitedTransport(
+            stage, STAGE_CONCURRENCY[stage], transport=get_shared_transport()
+        )
+    return _transports[stage]
+
+
+def build_openai_client(stage: str) -> openai.AsyncClient:
+    """
+    Build an OpenAI client whose requests are gated by the stage's semaphore
+
+    Args:
+        stage: One of "llm", "stt", "tts"
+
+    Returns:
+        AsyncClient to pass to the LiveKit OpenAI plugin via ``client=``
+    """
+    http_client = httpx.AsyncClient(
+        transport=get_stage_transport(stage),
+        timeout=httpx.Timeout(connect=15.0, read=30.0, write=5.0, pool=5.0),
+        follow_redirects=True,
+    )
+    # LiveKit's plugins handle retries themselves
+    return openai.AsyncClient(max_retries=0, http_client=http_client)
+
+
+def get_concurrency_stats() -> Dict[str, Dict]:
+    """Get wait statistics for all stages"""
+    return {stage: transport.get_stats() for stage, transport in _transports.items()}
@@ -0,0 +1,89 @@
+"""
+Prometheus Metrics for M4Markets Voice Agent
+Per-stage latency histograms (STT, end-of-turn, LLM, TTS) fed from the
+AgentSession metrics events, plus call duration
+
+Calls run in separate job processes, so metrics use prometheus_client's
+multiprocess mode: each process writes to PROMETHEUS_MULTIPROC_DIR and the
+worker's main process serves the aggregate on PROMETHEUS_PORT.
+"""
+
+import logging
+import os
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+PROMETHEUS_PORT = int(os.getenv("PROMETHEUS_PORT", "0"))
+
+# Must be set before prometheus_client is imported, in every process
+if PROMETHEUS_PORT:
+    os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "cache/prometheus")
+    Path(os.environ["PROMETHEUS_MULTIPROC_DIR"]).mkdir(parents=True, exist_ok=True)
+
+from prometheus_client import CollectorRegistry, Gauge, Histogram, start_http_server, multiprocess
+from livekit.agents.metrics import EOUMetrics, LLMMetrics, RealtimeModelMetrics, STTMetrics, TTSMetrics
+
+# Latency buckets in seconds
+STAGE_BUCKETS = (0.05, 0.1, 0.2, 0.4, 0.8, 1.6, 3.2)
+
+STT_LATENCY = Histogram("voice_stt_seconds", "STT request duration", buckets=STAGE_BUCKETS)
+EOU_DELAY = Histogram("voice_eou_delay_seconds", "End of speech to end of turn", buckets=STAGE_BUCKETS)
+LLM_TTFT = Histogram("voice_llm_ttft_seconds", "LLM time to first token", buckets=STAGE_BUCKETS)
+LLM_LATENCY = Histogram("voice_llm_seconds", "LLM full response duration", buckets=STAGE_BUCKETS)
+TTS_TTFB = Histogram("voice_tts_ttfb_seconds", "TTS time to first audio byte", buckets=STAGE_BUCKETS)
+CALL_DURATION = Histogram(
+    "voice_call_duration_seconds",
+    "Call duration",
+    ["outcome"],
+    buckets=(30, 60, 120, 300, 600, 1200, 1800),
+)
+PROMPT_INFO = Gauge(
+    "voice_system_prompt_info",
+    "Hash of the system prompt in use (changes mean a cold prompt cache)",
+    ["prompt_sha"],
+    multiprocess_mode="liveall",
+)
+
+
+def start_metrics_server():
+    """Serve metrics aggregated across job processes (call once, in the main process)"""
+    metrics_dir = Path(os.environ["PROMETHEUS_MULTIPROC_DIR"])
+    # Files left by a previous run would be aggregated with the new ones
+    for stale in metrics_dir.glob("*.db"):
+        stale.unlink()
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    start_http_server(PROMETHEUS_PORT, registry=registry)
+    logger.info(f"📈 Prometheus metrics on :{PROMETHEUS_PORT}/metrics")
+
+
+async def mark_job_process_dead():
+    """
+    Drop this process's live gauge files (job shutdown callback)
+    Without it the liveall prompt gauge of every finished job would stay in
+    PROMETHEUS_MULTIPROC_DIR and be scraped until the worker restarts
+    """
+    multiprocess.mark_process_dead(os.getpid())
+
+
+def observe_metrics(metrics):
+    """Record one AgentSession metrics_collected event"""
+    if isinstance(metrics, STTMetrics):
+        # Streaming STT reports 0 duration; only request-based STT is timed
+        if metrics.duration > 0:
+            STT_LATENCY.observe(metrics.duration)
+    elif isinstance(metrics, EOUMetrics):
+        EOU_DELAY.observe(metrics.end_of_utterance_delay)
+    elif isinstance(metrics, (LLMMetrics, RealtimeModelMetrics)):
+        if metrics.ttft >= 0:
+            LLM_TTFT.observe(metrics.ttft)
+        LLM_LATENCY.observe(metrics.duration)
+    elif isinstance(metrics, TTSMetrics):
+        TTS_TTFB.observe(metrics.ttfb)
+
+
+def observe_call(duration: float, outcome: str):
+    """Record a finished call"""
+    CALL_DURATION.labels(outcome=outcome).observe(duration)
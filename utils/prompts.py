@@ -0,0 +1,34 @@
+"""
+Prompt loading for M4Markets Voice Agent
+System prompts live as UTF-8 files under prompts/ and are read once per process
+"""
+
+import functools
+from pathlib import Path
+
+PROMPTS_DIR = Path(__file__).parent.parent / "prompts"
+
+
+@functools.lru_cache(maxsize=None)
+def load_prompt(name: str) -> str:
+    """
+    Load a prompt file from the prompts directory
+
+    Args:
+        name: File name relative to prompts/
+
+    Returns:
+        Prompt text (cached - the file is only read on first use)
+    """
+    return normalize_prompt((PROMPTS_DIR / name).read_text(encoding="utf-8"))
+
+
+def normalize_prompt(text: str) -> str:
+    """
+    Canonical form of a prompt: LF line endings, no trailing whitespace
+
+    Editor and checkout differences (CRLF, stray spaces) would otherwise change
+    the prompt prefix sent to OpenAI and invalidate its prompt cache on deploy
+    """
+    lines = text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines).strip("\n")
@@ -0,0 +1,88 @@
+"""
+Tool Result Cache
+Memoizes answers of tools whose output is static (account specs, regulation,
+concept definitions) so repeated questions skip the knowledge-base lookup
+"""
+
+import functools
+import logging
+import re
+import time
+import unicodedata
+from typing import Callable, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+_PUNCTUATION = re.compile(r"[¿?¡!.,;:\"']+")
+
+
+def normalize_query(value) -> str:
+    """
+    Normalize a tool argument so trivially different phrasings share a key
+    ("¿Qué es el Spread?" == "que es el spread")
+    """
+    if value is None:
+        return ""
+    if isinstance(value, (list, tuple)):
+        return "|".join(sorted(normalize_query(v) for v in value))
+
+    text = unicodedata.normalize("NFKD", str(value).lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = _PUNCTUATION.sub(" ", text)
+    return " ".join(text.split())
+
+
+class UncachedResult(str):
+    """
+    Tool answer that must not be cached (e.g. an error fallback)
+    Behaves as a plain string for the LLM; the cache just skips storing it
+    so a transient failure isn't replayed to every caller until the TTL ends
+    """
+
+
+def cache_tool_result(ttl: float = 3600, max_entries: int = 512) -> Callable:
+    """
+    Decorator to cache a tool's result per normalized arguments
+
+    Args:
+        ttl: Seconds a cached answer stays valid
+        max_entries: Oldest entries are evicted beyond this size
+
+    Usage:
+        @function_tool
+        @cache_tool_result(ttl=3600)
+        async def my_tool(query: str) -> str:
+            ...
+
+    Results wrapped in UncachedResult are returned but not stored.
+    """
+
+    def decorator(func: Callable) -> Callable:
+        cache: Dict[Tuple, Tuple[float, str]] = {}
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            key = (
+                tuple(normalize_query(a) for a in args),
+                tuple(sorted((k, normalize_query(v)) for k, v in kwargs.items())),
+            )
+            now = time.monotonic()
+
+            hit = cache.get(key)
+            if hit is not None and hit[0] > now:
+                logger.debug(f"⚡ Tool cache HIT: {func.__name__}")
+                return hit[1]
+
+            result = await func(*args, **kwargs)
+            if isinstance(result, UncachedResult):
+                return result
+
+            if len(cache) >= max_entries:
+                cache.pop(next(iter(cache)))
+            cache[key] = (now + ttl, result)
+            return result
+
+        wrapper.cache_clear = cache.clear
+        return wrapper
+
+    return decorator
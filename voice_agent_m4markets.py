@@ -4,38 +4,54 @@ LiveKit-based voice agent for M4Markets forex trading lead generation and qualif
 """
 
 import asyncio
+import functools
+import hashlib
 import logging
 import os
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Optional
 from dotenv import load_dotenv
 from livekit.agents import (
     Agent,
     AgentSession,
     AutoSubscribe,
+    ChatContext,
     JobContext,
+    JobProcess,
     WorkerOptions,
     cli,
     function_tool,
 )
+from livekit import rtc
 from livekit.plugins import openai, silero
 
+# Optional TTS provider - plugins must be imported on the main thread at startup
+try:
+    from livekit.plugins import cartesia
+except ImportError:
+    cartesia = None
+
 # Load environment variables
 load_dotenv()
 
 # Import utils for error handling and logging
 from utils.logger_config import setup_logger, log_call_started, log_call_ended, log_error_with_context
-from utils.error_handler import (
-    retry_with_backoff,
-    safe_execute_async,
-    ErrorRecovery,
-)
+from utils.error_handler import retry_with_backoff
 from utils.cost_metrics import metrics_tracker
-from utils.langfuse_integration import VoiceCallTracer, init_langfuse
-
-# Import tools
-from tools.knowledge_tools import query_m4markets_knowledge, get_account_comparison, get_regulation_info
-from tools.crm_tools import get_lead_history, save_conversation_note, qualify_and_save_lead, schedule_callback
-from tools.forex_tools import recommend_account_type, calculate_trading_costs, explain_forex_concept, get_market_hours_info
+from utils.openai_clients import build_openai_client, get_concurrency_stats
+from utils.prompts import load_prompt
+from utils.greeting_cache import (
+    greeting_cache_path,
+    load_cached_audio,
+    save_cached_audio,
+    synthesize_audio,
+    iter_audio_frames,
+)
+from utils import fast_json
 
 # Setup advanced logging
 logger = setup_logger("m4markets-agent")
@@ -49,340 +65,604 @@ AGENT_NAME = "M4Markets Sales Agent"
 AGENT_VOICE = os.getenv("AGENT_VOICE", "nova")  # nova is clear and fast
 VOICE_SPEED = float(os.getenv("VOICE_SPEED", "1.15"))  # 1.15x speed for lower latency
 
+# Room connection retry (tunable without a redeploy)
+CONNECT_MAX_RETRIES = int(os.getenv("CONNECT_MAX_RETRIES", "3"))
+CONNECT_INITIAL_DELAY = float(os.getenv("CONNECT_INITIAL_DELAY", "2.0"))
+
+# Max seconds to wait for a graceful room disconnect after a fatal error
+DISCONNECT_TIMEOUT = float(os.getenv("DISCONNECT_TIMEOUT", "2.0"))
+
+# Silero VAD: shortest speech that counts as a turn, and the silence that ends
+# one. A shorter silence ends turns sooner (0.55s is the plugin default).
+VAD_MIN_SPEECH_DURATION = float(os.getenv("VAD_MIN_SPEECH_DURATION", "0.05"))
+VAD_MIN_SILENCE_DURATION = float(os.getenv("VAD_MIN_SILENCE_DURATION", "0.4"))
+
+# Call lifetime limits: end the call after this long without speech from
+# either side, or after this long in total, so a stuck call can't hold the
+# worker indefinitely
+CALL_IDLE_TIMEOUT = float(os.getenv("CALL_IDLE_TIMEOUT", "90"))
+MAX_CALL_DURATION = float(os.getenv("MAX_CALL_DURATION", "1200"))
+
+# Threads for blocking work offloaded with asyncio.to_thread
+THREAD_POOL_WORKERS = int(os.getenv("THREAD_POOL_WORKERS", "16"))
+
+# Langfuse (and its SDK) is only imported when credentials are configured
+LANGFUSE_ENABLED = bool(os.getenv("LANGFUSE_PUBLIC_KEY"))
+
+# Prometheus latency metrics are served on this port when set
+PROMETHEUS_ENABLED = bool(os.getenv("PROMETHEUS_PORT"))
+
+# TTS provider: "openai" (default) or "cartesia" (Sonic, lower time-to-first-audio)
+TTS_PROVIDER = os.getenv("TTS_PROVIDER", "openai").lower()
+CARTESIA_MODEL = os.getenv("CARTESIA_MODEL", "sonic-3")
+CARTESIA_VOICE_ID = os.getenv("CARTESIA_VOICE_ID")
+
+# OpenAI Realtime (speech-to-speech over WebSocket) instead of STT -> LLM -> TTS.
+# Off by default so it can be A/B tested against the cascaded pipeline.
+# Realtime voices: alloy, ash, ballad, coral, echo, sage, shimmer, verse
+USE_REALTIME = os.getenv("USE_REALTIME", "0") == "1"
+REALTIME_MODEL = os.getenv("REALTIME_MODEL", "gpt-4o-realtime-preview")
+REALTIME_VOICE = sys.intern(os.getenv("REALTIME_VOICE", "alloy"))
+
+# Cascaded LLM. When FAST_LLM_MODEL is set, short turns and plain affirmations
+# ("sí", "ok", "dale") go to it and SPIN reasoning stays on LLM_MODEL.
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
+FAST_LLM_MODEL = os.getenv("FAST_LLM_MODEL")
+ROUTER_MAX_WORDS = int(os.getenv("ROUTER_MAX_WORDS", "8"))
+
+
+# Opening greeting. The text is fixed so its audio can be synthesized once and
+# replayed on every call (cache keyed by everything that changes the voice).
+GREETING_TEXT = "¡Hola! Soy el asistente virtual de M4Markets. ¿Con quién tengo el gusto?"
+GREETING_CACHE_PATH = greeting_cache_path(
+    GREETING_TEXT, TTS_PROVIDER, AGENT_VOICE, VOICE_SPEED, CARTESIA_MODEL, CARTESIA_VOICE_ID
+)
+# Realtime mode has no separate TTS, so the model generates the greeting
+GREETING_INSTRUCTIONS = "Saluda al usuario en español (LATAM) presentándote como el asistente virtual de M4Markets y pregunta su nombre."
+
+
+# Required environment variables
+_REQUIRED_VARS = frozenset({
+    "LIVEKIT_URL",
+    "LIVEKIT_API_KEY",
+    "LIVEKIT_API_SECRET",
+    "OPENAI_API_KEY",
+    "DB_URL",
+})
+
+# Descriptions, only consulted when something is missing
+_REQUIRED_VAR_DESCRIPTIONS = {
+    "LIVEKIT_URL": "LiveKit server URL",
+    "LIVEKIT_API_KEY": "LiveKit API key",
+    "LIVEKIT_API_SECRET": "LiveKit API secret",
+    "OPENAI_API_KEY": "OpenAI API key",
+    "DB_URL": "Database connection URL",
+}
+
 
 def validate_environment():
     """
     Validate that all required environment variables are set
     Exits with error if critical vars are missing
     """
-    required_vars = {
-        "LIVEKIT_URL": "LiveKit server URL",
-        "LIVEKIT_API_KEY": "LiveKit API key",
-        "LIVEKIT_API_SECRET": "LiveKit API secret",
-        "OPENAI_API_KEY": "OpenAI API key",
-        "DB_URL": "Database connection URL",
-    }
-
-    missing_vars = []
-    for var, description in required_vars.items():
-        if not os.getenv(var):
-            missing_vars.append(f"  - {var}: {description}")
-            logger.error(f"Missing required environment variable: {var}")
+    missing = _REQUIRED_VARS - os.environ.keys()
+    # Set-but-empty counts as missing too
+    missing |= {var for var in _REQUIRED_VARS - missing if not os.environ[var]}
 
-    if missing_vars:
+    if missing:
         logger.error("❌ Missing required environment variables:")
-        for var in missing_vars:
-            logger.error(var)
+        for var in sorted(missing):
+            logger.error("  - %s: %s", var, _REQUIRED_VAR_DESCRIPTIONS[var])
         logger.error("\nPlease set these variables in your .env file")
         sys.exit(1)
 
     logger.info("✅ All required environment variables validated")
 
 
-# System Instructions for M4Markets Agent
-M4MARKETS_INSTRUCTIONS = """
-# Eres un Agente de Ventas Experto para M4Markets
-
-## Identidad y Rol
-- Nombre: Agente M4Markets
-- Empresa: M4Markets - Broker de Forex y CFDs regulado internacionalmente
-- Tono: Profesional, consultivo, educativo pero cercano
-- Idioma: Español (Argentina/LATAM)
-- Objetivo: Calificar leads, educar sobre forex y cerrar cuentas de trading
-
-## Conocimiento de M4Markets
-
-### Regulaciones
-- CySEC (Chipre): Licencia 301/16 - Para clientes europeos
-- DFSA (Dubai): Licencia F007051 - Categoría 3A
-- FSA (Seychelles): Licencia SD047 - Para clientes internacionales
-- Fondos segregados en bancos tier 1
-- Protección contra balance negativo
-- Cobertura ICF hasta €20,000 (Europa)
-
-### Tipos de Cuenta
-1. **Standard**: Desde $5 | Spreads desde 1.1 pips | Sin comisiones | Leverage 1:1000
-   - Ideal: Principiantes y traders casuales
-
-2. **Raw Spreads**: Desde $100 | Spreads desde 0.0 pips | Comisión $3.5/lado | Leverage 1:500
-   - Ideal: Traders activos, scalpers, day traders
-
-3. **Premium**: Desde $1,000 | Spreads desde 0.8 pips | Sin comisiones | Leverage 1:1000
-   - Ideal: Capital significativo, beneficios VIP
-
-4. **Dynamic Leverage**: Desde $5 | Spreads desde 0.0 pips | Leverage hasta 1:5000
-   - Ideal: Traders que necesitan leverage flexible
-
-### Plataformas
-- MetaTrader 4 (MT4)
-- MetaTrader 5 (MT5)
-- cTrader
-- WebTrader (sin descarga)
-
-### Instrumentos
-- 50+ pares de Forex
-- Índices (US30, SPX500, DAX, etc.)
-- Commodities (Oro, Petróleo)
-- Criptomonedas
-- Acciones CFDs
-
-## Metodología de Venta: SPIN Adaptada para Forex
-
-### Etapa 1: SITUACIÓN (10-15 segundos)
-**Objetivo**: Entender contexto actual del prospecto
-
-Preguntas clave:
-- "¿Actualmente operás en Forex o CFDs?"
-- "¿Con qué broker operás hoy?"
-- "¿Cuánto tiempo le dedicás al trading por semana?"
-- "¿Qué tipo de operaciones hacés? (day trading, swing, posiciones largas)"
-
-**Acción**: Usa `get_lead_history(phone)` para ver historial previo
-
-### Etapa 2: PROBLEMA (40-60 segundos)
-**Objetivo**: Identificar pain points con broker actual o trading en general
-
-Preguntas SPIN - Problema:
-- "¿Qué es lo que más te frustra de tu broker actual?"
-- "¿Cómo son los spreads que te cobran? ¿Te parecen justos?"
-- "¿Alguna vez tuviste problemas con retiros o depósitos?"
-- "¿Qué te frena para operar más o aumentar tu capital?"
+class SalesStage(IntEnum):
+    """SPIN sales stages, one prompt file each under prompts/stages/"""
+    SITUACION = 1
+    PROBLEMA = 2
+    IMPLICACION = 3
+    NEED_PAYOFF = 4
+    CALIFICACION = 5
+    PRESENTACION = 6
+    OBJECIONES = 7
+    CIERRE = 8
+
+
+STAGE_PROMPTS = {
+    stage: load_prompt(f"stages/{stage.value}_{stage.name.lower()}.md") for stage in SalesStage
+}
+
+# Send only the current stage's script instead of all eight. The static core
+# (identity, product knowledge, rules) stays first so the cached prefix is
+# shared by every stage.
+STAGE_GATED_PROMPT = os.getenv("STAGE_GATED_PROMPT", "0") == "1"
+
+# Identity and product knowledge, then conversation rules and limits
+M4MARKETS_KNOWLEDGE = load_prompt("m4markets_knowledge.md")
+M4MARKETS_RULES = load_prompt("m4markets_rules.md")
+
+# System Instructions for M4Markets Agent: the full SPIN script, in its
+# original order (knowledge, methodology with all stages, rules)
+M4MARKETS_INSTRUCTIONS = "\n\n".join([
+    M4MARKETS_KNOWLEDGE,
+    "## Metodología de Venta: SPIN Adaptada para Forex",
+    *STAGE_PROMPTS.values(),
+    M4MARKETS_RULES,
+])
+
+# The prompt is fixed for the lifetime of the process: hash it once so
+# anything derived from it (prompt-cache keys, trace metadata) can use the
+# digest instead of re-hashing ~8 KB of text per call.
+# The hash is of the normalized text, so it only changes when the prompt does;
+# a new value after a deploy means OpenAI's prompt cache starts cold.
+PROMPT_SHA = hashlib.blake2b(M4MARKETS_INSTRUCTIONS.encode("utf-8"), digest_size=8).hexdigest()
+logger.info("📝 System prompt loaded: prompt_sha=%s (%d chars)", PROMPT_SHA, len(M4MARKETS_INSTRUCTIONS))
+
+
+def build_tts():
+    """
+    Build the TTS plugin for the cascaded pipeline
+    Falls back to OpenAI TTS if Cartesia is selected but not available
+    """
+    if TTS_PROVIDER == "cartesia":
+        if cartesia is None or not CARTESIA_VOICE_ID:
+            logger.warning("⚠️ Cartesia TTS requested but plugin or CARTESIA_VOICE_ID missing - using OpenAI TTS")
+        else:
+            return cartesia.TTS(
+                model=CARTESIA_MODEL,
+                voice=CARTESIA_VOICE_ID,
+                language="es",
+                speed=VOICE_SPEED,
+            )
 
-**Escucha activa**: Identifica pain points
-- Spreads altos → Resalta Raw Spreads (desde 0.0 pips)
-- Comisiones caras → Resalta Standard/Premium (sin comisiones)
-- Broker no confiable → Resalta regulaciones múltiples
-- Falta de educación → Resalta soporte 24/7 y materiales
-- Retiros lentos → Resalta procesamiento rápido
+    return openai.TTS(
+        voice=AGENT_VOICE,
+        speed=VOICE_SPEED,  # Faster speech for lower latency
+        client=build_openai_client("tts"),
+    )
 
-**Acción**: Guarda cada pain point con `save_conversation_note(phone, "pain_point", content)`
 
-### Etapa 3: IMPLICACIÓN (20-30 segundos)
-**Objetivo**: Amplificar el costo de no cambiar
+def build_llm():
+    """Build the cascaded LLM, routed by turn complexity if a fast model is configured"""
+    main_llm = openai.LLM(
+        model=LLM_MODEL,
+        temperature=0.6,  # Focused, shorter replies reach TTS sooner
+        client=build_openai_client("llm"),
+    )
+    if not FAST_LLM_MODEL:
+        return main_llm
 
-Preguntas SPIN - Implicación:
-- "¿Cuánto perdés aproximadamente en spreads altos por mes?"
-- "Si tu broker no es confiable, ¿qué pasa con tu capital?"
-- "¿Cómo impacta en tus resultados el no tener buena ejecución?"
-- "¿Cuántas oportunidades de trading perdés por falta de confianza?"
+    from utils.model_router import ModelRouter
 
-**Técnica**: Haz que el prospecto vea el costo de quedarse con su solución actual
+    fast_llm = openai.LLM(
+        model=FAST_LLM_MODEL,
+        temperature=0.6,
+        client=build_openai_client("llm"),
+    )
+    logger.info("🔀 LLM routing enabled: %s (short turns) / %s", FAST_LLM_MODEL, LLM_MODEL)
+    return ModelRouter(main_llm, fast_llm, max_words=ROUTER_MAX_WORDS)
 
-### Etapa 4: NEED-PAYOFF (30-40 segundos)
-**Objetivo**: Conectar solución M4Markets con sus necesidades
 
-Preguntas SPIN - Need-Payoff:
-- "¿Qué significaría para vos operar con spreads desde 0.0 pips?"
-- "¿Cómo cambiaría tu trading tener ejecución en milisegundos?"
-- "Si tuvieras un broker 100% regulado, ¿operarías con más confianza?"
-- "¿Qué harías con el dinero que ahorrás en spreads más bajos?"
+def build_models() -> dict:
+    """
+    Build the model plugins for an AgentSession
+    Plugins hold configuration and HTTP clients only, so one set is shared by
+    every call handled by the process
+    """
+    if USE_REALTIME:
+        # Single realtime model over one WebSocket: audio in, audio out,
+        # no separate STT/TTS hops per turn
+        return {
+            "llm": openai.realtime.RealtimeModel(
+                model=REALTIME_MODEL,
+                voice=REALTIME_VOICE,
+                temperature=0.7,
+            ),
+        }
+
+    # Optimized STT, LLM, TTS for the cascaded pipeline
+    return {
+        "stt": openai.STT(
+            language="es",  # Optimize for Spanish
+            client=build_openai_client("stt"),
+        ),
+        "llm": build_llm(),
+        "tts": build_tts(),
+    }
 
-**Acción**: Usa `query_m4markets_knowledge()` para detalles específicos
 
-### Etapa 5: CALIFICACIÓN (20-30 segundos)
-**Objetivo**: Determinar si el lead es HOT, WARM o COLD
+@functools.lru_cache(maxsize=1)
+def _load_tools() -> tuple:
+    """
+    Import the agent's function tools
+    The tool modules pull in the DB driver, HTTP client and KB config, so they
+    are loaded from prewarm rather than at module import. The tuple is built
+    once per process and shared by every call.
+    """
+    from tools.knowledge_tools import query_m4markets_knowledge, get_account_comparison, get_regulation_info
+    from tools.crm_tools import get_lead_history, save_conversation_note, qualify_and_save_lead, schedule_callback
+    from tools.forex_tools import recommend_account_type, calculate_trading_costs, explain_forex_concept, get_market_hours_info
+
+    return (
+        # Knowledge tools
+        query_m4markets_knowledge,
+        get_account_comparison,
+        get_regulation_info,
+        explain_forex_concept,
+        get_market_hours_info,
+        # CRM tools
+        get_lead_history,
+        save_conversation_note,
+        qualify_and_save_lead,
+        schedule_callback,
+        # Forex tools
+        recommend_account_type,
+        calculate_trading_costs,
+    )
+
+
+def build_lead_context(phone: Optional[str]) -> ChatContext:
+    """
+    Per-call context appended after the static system prompt
+    Kept out of M4MARKETS_INSTRUCTIONS so the prompt prefix never changes
+    """
+    chat_ctx = ChatContext()
+    if phone:
+        chat_ctx.add_message(
+            role="system",
+            content=f"Teléfono del lead en esta llamada: {phone}. Usalo en las herramientas que piden `phone`.",
+        )
+    return chat_ctx
 
-Preguntas directas:
-- "¿Tenés capital disponible para operar? ¿Aproximadamente cuánto?"
-- "¿Cuál es tu nivel de experiencia? (principiante/intermedio/avanzado)"
-- "¿Qué tan urgente es para vos cambiar de broker o empezar?"
 
-**Scoring**:
-- **HOT** (70-100): Capital $1000+, experiencia intermedia/avanzada, urgencia alta
-  → Acción: Handoff inmediato a humano
+def init_call_tracer(call_id: str, phone: str, room_name: str):
+    """
+    Create the Langfuse tracer for a call and attach its static metadata
+    Blocking (Langfuse SDK is sync) - run it off the event loop
 
-- **WARM** (40-69): Capital $200-1000, experiencia principiante/intermedia
-  → Acción: Agenda callback
+    Returns:
+        VoiceCallTracer, or None if Langfuse is unavailable
+    """
+    if not LANGFUSE_ENABLED:
+        return None
 
-- **COLD** (<40): Capital <$200, poca experiencia, baja urgencia
-  → Acción: WhatsApp follow-up, enviar info
+    try:
+        from utils.langfuse_integration import VoiceCallTracer
+
+        tracer = VoiceCallTracer(call_id, phone)
+        if tracer.trace:
+            tracer.set_metadata({
+                "room_name": room_name,
+                "voice": REALTIME_VOICE if USE_REALTIME else AGENT_VOICE,
+                "speed": VOICE_SPEED,
+                "realtime": USE_REALTIME,
+                "agent_version": "v1.1.0",
+                "prompt_hash": PROMPT_SHA,
+            })
+            tracer.set_tags(["m4markets", "sales", "voice"])
+        return tracer
+    except Exception as e:
+        logger.warning("⚠️ Langfuse initialization failed (continuing without it): %s", e)
+        return None
 
-**Acción**: Usa `qualify_and_save_lead()` para calcular score automático
 
-### Etapa 6: PRESENTACIÓN (30-40 segundos)
-**Objetivo**: Presentar solución M4Markets personalizada
+def install_uvloop():
+    """
+    Use uvloop for event loops created from here on, when available
+    uvloop gives faster socket/timer handling for this I/O-bound worker.
+    Called in the supervisor (__main__) and in each job process (prewarm,
+    before the job's loop is built); safe to call more than once.
+    cli.run_app creates the loop itself, so this sets the loop policy rather
+    than using uvloop.run(). uvloop.install() is deprecated on Python 3.12+
+    and loop policies on 3.14+; there the default asyncio loop is kept.
+    """
+    if sys.version_info >= (3, 14):
+        return
+    try:
+        import uvloop
+    except ImportError:
+        return
+    if isinstance(asyncio.get_event_loop_policy(), uvloop.EventLoopPolicy):
+        return
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    logger.info("⚡ Using uvloop event loop")
 
-Basado en calificación, recomienda:
-- Tipo de cuenta ideal: Usa `recommend_account_type(capital, experience)`
-- Beneficios específicos para sus pain points
-- Proceso simple de apertura (10 minutos)
-- Soporte 24/7 en español
 
-**Técnica**: Conecta beneficios M4Markets con pain points identificados
+def configure_event_loop(proc: JobProcess):
+    """
+    Tune the job process's event loop, once per loop
+    - Eager tasks run synchronously up to their first real await, saving a loop
+      iteration per short-lived task (tool calls, trace updates). Python 3.12+.
+    - A sized default executor for the blocking work sent through
+      asyncio.to_thread (Langfuse SDK, metrics summary logging)
+    """
+    loop = asyncio.get_running_loop()
+    if proc.userdata.get("configured_loop") is loop:
+        return
+    proc.userdata["configured_loop"] = loop
 
-### Etapa 7: MANEJO DE OBJECIONES (20-40 segundos)
-**Objetivo**: Resolver dudas y objeciones
+    eager_task_factory = getattr(asyncio, "eager_task_factory", None)
+    if eager_task_factory is not None:
+        loop.set_task_factory(eager_task_factory)
 
-**Objeciones comunes**:
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=THREAD_POOL_WORKERS))
 
-1. "Ya tengo broker"
-   → "Entiendo. ¿Qué tal los spreads y ejecución que te dan? Porque M4Markets ofrece spreads desde 0.0 pips y ejecución en milisegundos. ¿Querés que te muestre una comparación?"
 
-2. "No tengo suficiente capital"
-   → "Perfecto, por eso M4Markets permite empezar desde $5 con la cuenta Standard. También podés practicar gratis con una demo. ¿Te gustaría probarla?"
+async def _cache_greeting(tts, proc: JobProcess):
+    """Synthesize the greeting once and store it for later calls"""
+    try:
+        audio = await synthesize_audio(tts, GREETING_TEXT)
+        await asyncio.to_thread(save_cached_audio, GREETING_CACHE_PATH, audio)
+        proc.userdata["greeting_audio"] = audio
+    except Exception as e:
+        logger.warning("⚠️ Failed to cache greeting audio: %s", e)
 
-3. "No confío en brokers online"
-   → "Es totalmente válido ser cauteloso. M4Markets está regulado por CySEC en Europa, DFSA en Dubai y FSA en Seychelles. Los fondos están segregados en bancos tier 1. ¿Querés que te explique más sobre las regulaciones?"
 
-4. "Es muy complicado"
-   → "Te entiendo, pero el proceso es súper simple: 10 minutos para abrir la cuenta, verificación rápida, y ya podés operar. Además tenés soporte 24/7 en español. ¿Te gustaría que te guíe paso a paso?"
+async def play_greeting(session: AgentSession, proc: JobProcess):
+    """
+    Play the fixed opening greeting
+    Uses the pre-synthesized audio when available (no LLM or TTS round-trip);
+    otherwise speaks it live and caches the audio in the background
+    """
+    audio = proc.userdata.get("greeting_audio")
+    if audio is not None:
+        await session.say(GREETING_TEXT, audio=iter_audio_frames(audio))
+        return
+
+    # Keep a reference so the background task isn't garbage collected
+    proc.userdata["greeting_cache_task"] = asyncio.create_task(_cache_greeting(session.tts, proc))
+    await session.say(GREETING_TEXT)
+
+
+@functools.lru_cache(maxsize=1024)
+def _extract_phone_from_metadata(metadata: str) -> Optional[str]:
+    """Lead phone from the room metadata JSON (cached per metadata string)"""
+    parsed = fast_json.loads(metadata)
+    return parsed.get('phone') or parsed.get('lead_phone')
+
+
+@functools.lru_cache(maxsize=None)
+def build_stage_instructions(stage: SalesStage) -> str:
+    """Knowledge + rules + stage index + the given stage's script (built once per stage)"""
+    return "\n\n".join([
+        M4MARKETS_KNOWLEDGE,
+        M4MARKETS_RULES,
+        load_prompt("m4markets_stage_index.md"),
+        f"## Etapa actual: {stage.value}",
+        STAGE_PROMPTS[stage],
+    ])
+
+
+class M4MarketsAgent(Agent):
+    """Agent whose instructions carry only the current sales stage"""
+
+    def __init__(self, **kwargs):
+        self.stage = SalesStage.SITUACION
+        super().__init__(instructions=build_stage_instructions(self.stage), **kwargs)
+
+    @function_tool
+    async def advance_stage(self, etapa: int) -> str:
+        """
+        Pasar a otra etapa de la venta y recibir sus instrucciones
+
+        Args:
+            etapa: Número de etapa (1-8) según el índice de etapas
+        """
+        try:
+            stage = SalesStage(etapa)
+        except ValueError:
+            return "Etapa inválida: usá un número del 1 al 8"
 
-5. "Los spreads/comisiones son muy altos"
-   → Usa `calculate_trading_costs()` para mostrar costos reales vs competencia
+        if stage != self.stage:
+            logger.info("🧭 Sales stage: %s -> %s", self.stage.name, stage.name)
+            self.stage = stage
+            await self.update_instructions(build_stage_instructions(stage))
+        return f"Etapa actual: {stage.value} ({stage.name})"
 
-6. "¿Qué es el leverage/spread/pip?" (pregunta educativa)
-   → Usa `explain_forex_concept(concept)` para explicar
 
-**Acción**: Guarda objeciones con `save_conversation_note(phone, "objection", content)`
+# Lead phone for the current call - a ContextVar so concurrent calls in the
+# same process can't overwrite each other's value
+current_lead_phone: ContextVar[Optional[str]] = ContextVar("current_lead_phone", default=None)
 
-### Etapa 8: CIERRE (15-20 segundos)
-**Objetivo**: Cerrar o agendar siguiente paso
 
-**Para HOT leads** (score 70+):
-- "Perfecto, veo que estás listo para dar el paso. Te voy a conectar ahora mismo con uno de nuestros especialistas que va a ayudarte a abrir tu cuenta. ¿Te parece?"
-- → Acción: Transferir a humano / Enviar link de registro
+@retry_with_backoff(
+    max_retries=CONNECT_MAX_RETRIES,
+    initial_delay=CONNECT_INITIAL_DELAY,
+    # LiveKit signalling reconnects are fast - don't back off on the first drop.
+    # ctx.connect() raises rtc.ConnectError, which isn't a ConnectionError
+    immediate_retry_exceptions=(rtc.ConnectError, ConnectionError),
+)
+async def connect_to_room(ctx: JobContext):
+    """Connect to the LiveKit room (audio only) with retry"""
+    await ctx.connect(auto_subscribe=AutoSubscribe.AUDIO_ONLY)
 
-**Para WARM leads** (score 40-69):
-- "Genial, veo que te interesa. ¿Qué te parece si agendamos una llamada con un especialista para mañana o pasado? ¿Qué horario te viene bien?"
-- → Acción: `schedule_callback(phone, preferred_time, notes)`
 
-**Para COLD leads** (score <40):
-- "Entiendo, no hay apuro. Te voy a mandar por WhatsApp info sobre las cuentas y algunos materiales educativos. Cuando estés listo, nos contactás. ¿Te parece?"
-- → Acción: Marcar para seguimiento por WhatsApp
+async def wait_for_call_end(session: AgentSession) -> str:
+    """
+    Block until the call is over
 
-## Reglas de Conversación
+    Returns:
+        "completed" when the session closes (e.g. the caller hung up),
+        "idle_timeout" after CALL_IDLE_TIMEOUT seconds without speech,
+        "max_duration" after MAX_CALL_DURATION seconds
+    """
+    loop = asyncio.get_running_loop()
+    closed = asyncio.Event()
+    last_activity = loop.time()
 
-1. **Empieza con contexto**: Siempre llama `get_lead_history()` al inicio
-2. **Escucha activa**: No interrumpas, deja que el prospecto hable
-3. **Preguntas abiertas**: Usa preguntas que empiecen con "qué", "cómo", "por qué"
-4. **Conecta pain points**: Relaciona cada beneficio M4Markets con un pain point
-5. **Usa datos reales**: Llama `query_m4markets_knowledge()` para info actualizada
-6. **Guarda todo**: Cada pain point, objeción, interés → `save_conversation_note()`
-7. **Educa, no vendas**: Posicionate como consultor, no vendedor agresivo
-8. **Sé conciso**: Respuestas de 15-30 segundos máximo
-9. **Confirma entendimiento**: "¿Tiene sentido?" "¿Está claro?"
-10. **Cierra siempre**: Toda conversación debe terminar con próximo paso claro
+    def _touch(_event):
+        nonlocal last_activity
+        last_activity = loop.time()
 
-## Límites y Disclaimers
+    session.on("close", lambda _event: closed.set())
+    session.on("user_input_transcribed", _touch)
+    session.on("agent_state_changed", _touch)
 
-- **NO** des consejos de inversión específicos
-- **NO** garantices retornos o ganancias
-- **SÍ** menciona que "operar con CFDs implica riesgo significativo de pérdida"
-- **SÍ** recomienda empezar con cuenta demo si es principiante total
-- **SÍ** sé transparente sobre costos y riesgos
+    async def _idle_watchdog():
+        while (remaining := last_activity + CALL_IDLE_TIMEOUT - loop.time()) > 0:
+            await asyncio.sleep(remaining)
 
----
+    closed_task = asyncio.create_task(closed.wait())
+    idle_task = asyncio.create_task(_idle_watchdog())
+    try:
+        done, _ = await asyncio.wait(
+            {closed_task, idle_task},
+            timeout=MAX_CALL_DURATION,
+            return_when=asyncio.FIRST_COMPLETED,
+        )
+    finally:
+        closed_task.cancel()
+        idle_task.cancel()
 
-**IMPORTANTE**: Usa las herramientas frecuentemente durante la conversación, no solo al final. Guarda notas en tiempo real.
-"""
+    if closed_task in done:
+        return "completed"
+    return "idle_timeout" if idle_task in done else "max_duration"
 
 
-# Global variable to track current lead phone
-current_lead_phone = None
+def prewarm(proc: JobProcess):
+    """
+    Load per-process resources once, before any job is assigned
+    The Silero ONNX model and the STT/LLM/TTS plugins (with their HTTP
+    clients) are built here instead of on every call
+    """
+    # Job processes don't run __main__; set the loop policy for this one
+    install_uvloop()
+
+    # One ONNX session per process, shared by every call (the plugin already
+    # limits it to a single inference thread)
+    proc.userdata["vad"] = silero.VAD.load(
+        min_speech_duration=VAD_MIN_SPEECH_DURATION,
+        min_silence_duration=VAD_MIN_SILENCE_DURATION,
+    )
+    proc.userdata["models"] = build_models()
+    proc.userdata["greeting_audio"] = load_cached_audio(GREETING_CACHE_PATH)
+
+    # Pay tool and Langfuse import cost here, off the request path
+    _load_tools()
+    if LANGFUSE_ENABLED:
+        import utils.langfuse_integration  # noqa: F401
+    if PROMETHEUS_ENABLED:
+        from utils.prometheus_metrics import PROMPT_INFO
+        PROMPT_INFO.labels(prompt_sha=PROMPT_SHA).set(1)
 
 
 async def entrypoint(ctx: JobContext):
     """
     Main entrypoint for LiveKit agent with robust error handling and cost tracking
     """
-    global current_lead_phone
+    # Before any task is created, so every task of the job gets the factory
+    configure_event_loop(ctx.proc)
+
     call_id = f"call_{ctx.room.name}"
-    start_time = asyncio.get_event_loop().time()
+    start_ns = time.monotonic_ns()
     outcome = "unknown"
+    shutdown_reason = None
     langfuse_tracer = None
 
     # Start metrics tracking
     call_metrics = metrics_tracker.start_call(call_id)
 
-    try:
-        logger.info(f"🚀 Starting voice agent for room: {ctx.room.name}")
+    # Pending trace writes are flushed when the job shuts down
+    if LANGFUSE_ENABLED:
+        from utils.langfuse_integration import trace_writer
+        # LiveKit passes the shutdown reason to one-argument callbacks; keep
+        # it out of flush()'s timeout
+        ctx.add_shutdown_callback(lambda _reason: trace_writer.flush())
 
-        # Validate environment before starting
-        validate_environment()
+    # This job process's live gauges go away with it
+    if PROMETHEUS_ENABLED:
+        from utils.prometheus_metrics import mark_job_process_dead
+        ctx.add_shutdown_callback(mark_job_process_dead)
 
-        # Connect to room with retry
-        logger.info(f"Connecting to room: {ctx.room.name}")
+    # Conversation notes are saved in batches; write what's left at job end,
+    # then close the pool they were written through
+    from tools.crm_tools import flush_notes_and_close_pool
+    ctx.add_shutdown_callback(flush_notes_and_close_pool)
 
-        @retry_with_backoff(max_retries=3, initial_delay=2.0)
-        async def connect_to_room():
-            await ctx.connect(auto_subscribe=AutoSubscribe.AUDIO_ONLY)
+    try:
+        logger.info("🚀 Starting voice agent for room: %s", ctx.room.name)
 
-        await connect_to_room()
+        # Connect to room with retry
+        logger.info("Connecting to room: %s", ctx.room.name)
+        await connect_to_room(ctx)
         logger.info("✅ Successfully connected to LiveKit room")
 
         # Extract phone number from room metadata
         if hasattr(ctx.room, 'metadata') and ctx.room.metadata:
             try:
-                import json
-                metadata = json.loads(ctx.room.metadata)
-                phone = metadata.get('phone') or metadata.get('lead_phone')
+                phone = _extract_phone_from_metadata(ctx.room.metadata)
                 if phone:
-                    current_lead_phone = phone
+                    current_lead_phone.set(phone)
                     log_call_started(logger, call_id, phone)
+
+                    # The prompt's first tool call is get_lead_history(); load it
+                    # now so it is ready by the time the greeting has played
+                    from tools.crm_tools import prefetch_lead_history, discard_lead_history_prefetch
+                    prefetch_lead_history(phone)
+                    ctx.add_shutdown_callback(lambda: discard_lead_history_prefetch(phone))
             except Exception as e:
-                logger.warning(f"Failed to extract phone from metadata: {str(e)}")
+                logger.warning("Failed to extract phone from metadata: %s", e)
 
-        # Initialize Langfuse tracer (optional - won't block agent if it fails)
-        try:
-            langfuse_tracer = VoiceCallTracer(call_id, current_lead_phone)
-            if langfuse_tracer.trace:
-                langfuse_tracer.set_metadata({
-                    "room_name": ctx.room.name,
-                    "voice": AGENT_VOICE,
-                    "speed": VOICE_SPEED,
-                    "agent_version": "v1.1.0"
-                })
-                langfuse_tracer.set_tags(["m4markets", "sales", "voice"])
-        except Exception as e:
-            logger.warning(f"⚠️ Langfuse initialization failed (continuing without it): {str(e)}")
-            langfuse_tracer = None
+        # Initialize Langfuse tracer (optional - won't block agent if it fails).
+        # Trace creation is blocking HTTP, so it runs in a thread and overlaps
+        # with the participant negotiating the connection.
+        tracer_task = asyncio.create_task(
+            asyncio.to_thread(init_call_tracer, call_id, current_lead_phone.get(), ctx.room.name)
+        )
 
         # Wait for participant
         logger.info("Waiting for participant...")
-        participant = await asyncio.wait_for(
-            ctx.wait_for_participant(),
-            timeout=300  # 5 minute timeout
-        )
-        logger.info(f"✅ Participant joined: {participant.identity}")
-
-        # Create Agent with instructions and tools
-        agent = Agent(
-            instructions=M4MARKETS_INSTRUCTIONS,
-            tools=[
-                # Knowledge tools
-                query_m4markets_knowledge,
-                get_account_comparison,
-                get_regulation_info,
-                explain_forex_concept,
-                get_market_hours_info,
-                # CRM tools
-                get_lead_history,
-                save_conversation_note,
-                qualify_and_save_lead,
-                schedule_callback,
-                # Forex tools
-                recommend_account_type,
-                calculate_trading_costs,
-            ],
-        )
-
-        # Create AgentSession with optimized STT, LLM, TTS, VAD
-        session = AgentSession(
-            vad=silero.VAD.load(),
-            stt=openai.STT(
-                language="es",  # Optimize for Spanish
-            ),
-            llm=openai.LLM(
-                model="gpt-4o-mini",
-                temperature=0.7,  # Slightly creative but focused
-            ),
-            tts=openai.TTS(
-                voice=AGENT_VOICE,
-                speed=VOICE_SPEED,  # Faster speech for lower latency
-            ),
+        try:
+            participant = await asyncio.wait_for(
+                ctx.wait_for_participant(),
+                timeout=300  # 5 minute timeout
+            )
+        finally:
+            langfuse_tracer = await tracer_task
+        logger.info("✅ Participant joined: %s", participant.identity)
+
+        # Create Agent with instructions and tools. The instructions are the
+        # identical static prefix on every call so OpenAI's prompt cache hits;
+        # per-call lead context goes in a separate message after it.
+        agent_kwargs = dict(
+            chat_ctx=build_lead_context(current_lead_phone.get()),
+            tools=list(_load_tools()),  # SDK expects a list; the tuple itself is shared
         )
+        if STAGE_GATED_PROMPT:
+            agent = M4MarketsAgent(**agent_kwargs)
+        else:
+            agent = Agent(instructions=M4MARKETS_INSTRUCTIONS, **agent_kwargs)
+
+        # Model plugins are built once per process in prewarm and shared
+        models = ctx.proc.userdata["models"]
+        if USE_REALTIME:
+            session = AgentSession(
+                vad=ctx.proc.userdata["vad"],
+                llm=models["llm"],
+            )
+            logger.info("✅ Session config: Realtime model=%s, Voice=%s", REALTIME_MODEL, REALTIME_VOICE)
+        else:
+            session = AgentSession(
+                vad=ctx.proc.userdata["vad"],
+                stt=models["stt"],
+                llm=models["llm"],
+                tts=models["tts"],
+                # Start the LLM on interim transcripts instead of waiting for the
+                # final one; cancelled and restarted if the final text differs
+                preemptive_generation=True,
+                # LLM tokens stream into TTS sentence by sentence; let the user
+                # barge in, but ignore one-word noise ("eh", "mm")
+                allow_interruptions=True,
+                min_interruption_words=2,
+            )
+            logger.info("✅ Session config: TTS=%s, Voice=%s, Speed=%sx", TTS_PROVIDER, AGENT_VOICE, VOICE_SPEED)
 
-        logger.info(f"✅ Session config: Voice={AGENT_VOICE}, Speed={VOICE_SPEED}x")
+        if PROMETHEUS_ENABLED:
+            from utils.prometheus_metrics import observe_metrics
+            session.on("metrics_collected", lambda ev: observe_metrics(ev.metrics))
 
         logger.info("✅ Agent and Session created successfully")
 
@@ -390,14 +670,25 @@ async def entrypoint(ctx: JobContext):
         await session.start(agent=agent, room=ctx.room)
         logger.info("✅ Agent session started")
 
-        # Generate greeting
-        greeting_instructions = "Saluda al usuario en español (LATAM) presentándote como el asistente virtual de M4Markets y pregunta su nombre."
-        await session.generate_reply(instructions=greeting_instructions)
+        # Greeting
+        if USE_REALTIME:
+            await session.generate_reply(instructions=GREETING_INSTRUCTIONS)
+        else:
+            await play_greeting(session, ctx.proc)
         logger.info("✅ Greeting sent to participant")
 
-        # Agent is now active and will handle the conversation automatically
+        # Agent is now active and will handle the conversation automatically.
+        # Stay here until the call ends so the teardown below (metrics, trace,
+        # call log) runs at the real end of the call.
         logger.info("🎙️ Agent is active and handling conversation")
-        outcome = "completed"
+        outcome = await wait_for_call_end(session)
+
+        if outcome != "completed":
+            logger.warning("⏱️ Ending call: %s", outcome)
+            await session.aclose()
+            # The job is shut down in the finally block, once the final trace
+            # update is queued for the shutdown callbacks' flush
+            shutdown_reason = outcome
 
     except asyncio.TimeoutError:
         logger.error("⏱️ Timeout waiting for participant to join")
@@ -408,65 +699,100 @@ async def entrypoint(ctx: JobContext):
             call_id=call_id
         )
 
+    except asyncio.CancelledError:
+        # Job cancelled by the worker (shutdown / drain) mid-call
+        outcome = "cancelled"
+        raise
+
     except Exception as e:
-        logger.error(f"❌ Fatal error in voice agent: {str(e)}", exc_info=True)
+        logger.error("❌ Fatal error in voice agent: %s", e, exc_info=True)
         outcome = "error"
         log_error_with_context(logger, e, call_id=call_id)
 
-        # Attempt graceful shutdown
+        # Attempt graceful shutdown, bounded so a wedged signalling socket
+        # can't hold the worker until the OS TCP timeout
         try:
             if hasattr(ctx, 'room') and ctx.room:
                 logger.info("Attempting graceful disconnect...")
-                await ctx.room.disconnect()
+                await asyncio.wait_for(
+                    asyncio.shield(ctx.room.disconnect()),
+                    timeout=DISCONNECT_TIMEOUT
+                )
+        except asyncio.TimeoutError:
+            logger.error("Graceful disconnect timed out after %.1fs - abandoning it", DISCONNECT_TIMEOUT)
         except Exception as disconnect_error:
-            logger.error(f"Error during graceful disconnect: {str(disconnect_error)}")
+            logger.error("Error during graceful disconnect: %s", disconnect_error)
 
         # Re-raise for upper-level handling
         raise
 
     finally:
         # Log call completion
-        duration = asyncio.get_event_loop().time() - start_time
+        duration = (time.monotonic_ns() - start_ns) / 1e9
 
         # End metrics tracking and get final report
-        final_metrics = metrics_tracker.end_call(call_id)
+        # end_call formats and writes the summary to the log files - keep that
+        # file I/O off the event loop
+        final_metrics = await asyncio.to_thread(metrics_tracker.end_call, call_id)
 
-        # End Langfuse trace with final metrics
+        if PROMETHEUS_ENABLED:
+            from utils.prometheus_metrics import observe_call
+            observe_call(duration, outcome)
+
+        # End Langfuse trace with final metrics (written in the background)
         if langfuse_tracer and langfuse_tracer.trace:
             final_metadata = {
                 "duration_minutes": duration / 60,
                 "outcome": outcome,
+                "openai_concurrency": get_concurrency_stats(),
             }
             if final_metrics:
                 final_metadata.update({
                     "total_cost": final_metrics['total'],
                     "cost_per_minute": final_metrics['cost_per_minute'],
                     "tool_calls": final_metrics['usage']['tool_calls'],
-                    "stt_cost": final_metrics['stt'],
-                    "llm_cost": final_metrics['llm'],
-                    "tts_cost": final_metrics['tts'],
+                    "stt_cost": final_metrics['breakdown']['stt'],
+                    "llm_cost": final_metrics['breakdown']['llm'],
+                    "tts_cost": final_metrics['breakdown']['tts'],
                 })
-            langfuse_tracer.end_trace(outcome, final_metadata)
+            from utils.langfuse_integration import trace_writer
+            trace_writer.submit(langfuse_tracer.end_trace, outcome, final_metadata)
 
-        if current_lead_phone:
+        lead_phone = current_lead_phone.get()
+        if lead_phone:
             log_call_ended(
                 logger,
                 call_id,
-                current_lead_phone,
+                lead_phone,
                 duration,
                 outcome
             )
 
-        logger.info(f"✨ Call completed. Duration: {duration:.2f}s | Outcome: {outcome}")
+        logger.info("✨ Call completed. Duration: %.2fs | Outcome: %s", duration, outcome)
 
         # Log cost summary
         if final_metrics:
             logger.info(
-                f"💰 Cost: ${final_metrics['total']:.4f} "
-                f"(${final_metrics['cost_per_minute']:.4f}/min) | "
-                f"Tools: {final_metrics['usage']['tool_calls']}"
+                "💰 Cost: $%.4f ($%.4f/min) | Tools: %s",
+                final_metrics['total'],
+                final_metrics['cost_per_minute'],
+                final_metrics['usage']['tool_calls'],
             )
 
+        # Only now, so the shutdown callbacks flush the end_trace queued above
+        if shutdown_reason:
+            ctx.shutdown(reason=shutdown_reason)
+
 
 if __name__ == "__main__":
-    cli.run_app(WorkerOptions(entrypoint_fnc=entrypoint))
+    # Validate once at worker startup rather than on every call
+    validate_environment()
+
+    install_uvloop()
+
+    # Metrics from every job process are aggregated and served from here
+    if PROMETHEUS_ENABLED:
+        from utils.prometheus_metrics import start_metrics_server
+        start_metrics_server()
+
+    cli.run_app(WorkerOptions(entrypoint_fnc=entrypoint, prewarm_fnc=prewarm))
@@ -4,17 +4,141 @@ M4Markets Voice Sales Agent - Simplified Version
 Compatible with LiveKit Agents v1.3+ API
 """
 
+import functools
 import os
+import sys
 import logging
+from typing import Final, Literal, Optional
 from dotenv import load_dotenv
 from livekit import agents
-from livekit.agents import JobContext, WorkerOptions, cli, Agent
+from livekit.agents import ChatContext, JobContext, JobProcess, WorkerOptions, cli, Agent, function_tool
 from livekit.plugins import openai
 
+# Before the utils imports, which read their settings from the environment
 load_dotenv()
 
-logging.basicConfig(level=logging.INFO)
+from utils.greeting_cache import GREETING_AUDIO_PATH, load_cached_audio, iter_audio_frames
+from utils.prompts import load_prompt
+
+# WARNING by default so third-party loggers (LiveKit plugins, OpenAI, httpx)
+# don't format per-event debug/info output on the audio path; the agent's own
+# logger stays at INFO
+logging.basicConfig(level=logging.WARNING)
 logger = logging.getLogger("m4markets-agent")
+logger.setLevel(logging.INFO)
+for noisy_logger in ("livekit", "openai", "httpx"):
+    logging.getLogger(noisy_logger).setLevel(logging.WARNING)
+
+# LiveKit credentials, read once at import. Checked at startup so a missing
+# value stops the worker instead of failing the first call.
+LIVEKIT_URL = os.getenv("LIVEKIT_URL")
+LIVEKIT_API_KEY = os.getenv("LIVEKIT_API_KEY")
+LIVEKIT_API_SECRET = os.getenv("LIVEKIT_API_SECRET")
+_REQUIRED_ENV: Final[tuple] = ("LIVEKIT_URL", "LIVEKIT_API_KEY", "LIVEKIT_API_SECRET", "OPENAI_API_KEY")
+
+# Realtime model, switchable from the environment for A/B tests. The mini
+# variant has lower time-to-first-audio and cost, enough for a scripted call.
+# Separate from the main agent's REALTIME_MODEL so each keeps its own default.
+SIMPLE_REALTIME_MODEL = os.getenv("SIMPLE_REALTIME_MODEL", "gpt-4o-mini-realtime-preview-2024-12-17")
+
+# Cap on output tokens per response. Audio tokens count too (~20 per second
+# of speech), so 800 leaves room for the script's 30 s maximum answer.
+MAX_RESPONSE_TOKENS = int(os.getenv("MAX_RESPONSE_TOKENS", "800"))
+
+# Worker process tuning: prewarmed processes kept ready for incoming calls,
+# and the per-call memory (MB) above which the SDK logs a warning. Unset
+# keeps the SDK defaults, including no idle processes in dev mode.
+WORKER_TUNING: Final[dict] = {
+    option: int(os.environ[env_var])
+    for option, env_var in (
+        ("num_idle_processes", "NUM_IDLE_PROCESSES"),
+        ("job_memory_warn_mb", "JOB_MEMORY_WARN_MB"),
+    )
+    if os.getenv(env_var)
+}
+
+# Opener (prompts/maicol_saludo.md), also what the pre-rendered recording at
+# GREETING_AUDIO_PATH says, so it lands in the chat history as well. The
+# prompt's {saludo} placeholder is filled from it.
+GREETING_TEXT: Final[str] = load_prompt("maicol_saludo.md")
+
+# Static prompt (prompts/maicol.md), read once at import. It is sent unchanged
+# on every session so OpenAI's prompt cache can reuse the prefix; per-call text
+# goes in generate_reply() only. This is the only copy: the realtime model gets
+# it through the Agent's instructions.
+_INSTRUCTIONS: Final[str] = load_prompt("maicol.md").replace("{saludo}", GREETING_TEXT)
+
+# Example exchanges, seeded as chat history instead of living in the
+# instructions. The realtime session creates them once as conversation items,
+# and they act as real few-shot turns rather than prose to imitate.
+_EXAMPLE_DIALOGUES: Final[tuple] = (
+    # Principiante
+    (
+        ("Hola, soy Juan.",
+         "Perfecto, Juan. ¿Actualmente operas en Forex o es algo nuevo para vos?"),
+        ("Es algo nuevo para mí.",
+         "Genial que quieras empezar. Forex es el mercado de divisas, el mas grande del mundo. "
+         "¿Te interesa como forma de ingresos extra o queres aprender a operar profesionalmente?"),
+        ("Ingresos extra, más que nada.",
+         "¿Cuanto capital aproximado pensas destinar al trading?"),
+        ("Unos cien dólares.",
+         "Basado en lo que me contas, te recomendaria nuestra cuenta Standard. "
+         "Podes empezar desde $5 USD, spreads competitivos desde 1.0 pip, y sin comisiones. "
+         "Es perfecta para arrancar. ¿Te gustaria que te ayude a abrirla?"),
+        ("Prefiero probar primero.",
+         "Si queres practicar primero, podes abrir una cuenta demo gratuita. "
+         "Te doy $10,000 virtuales para que pruebes sin riesgo. ¿Te parece?"),
+    ),
+    # Trader con experiencia
+    (
+        ("Sí, ya opero hace dos años.",
+         "Perfecto. ¿Con que broker operas ahora? ¿Como te va con los spreads y comisiones?"),
+        ("Los spreads son altos. Hago scalping con unos cinco mil dólares.",
+         "Por tu experiencia y capital, te conviene nuestra Raw Spread account. "
+         "Spreads desde 0.0 pips, comision de $3 por lote. Ideal para scalping y day trading. "
+         "¿Queres que veamos como abrirla?"),
+        ("Dale.",
+         "Perfecto. El proximo paso es abrir tu cuenta. Es 100% online, toma 5 minutos. "
+         "¿Queres que te envie el link para registrarte?"),
+    ),
+)
+
+
+@functools.lru_cache(maxsize=1)
+def _example_context() -> ChatContext:
+    """Few-shot history built once per process (agents get a copy)"""
+    chat_ctx = ChatContext()
+    chat_ctx.add_message(role="system", content="Ejemplos de conversaciones de Maicol. No son parte de esta llamada.")
+    for dialogue in _EXAMPLE_DIALOGUES:
+        for user_text, agent_text in dialogue:
+            chat_ctx.add_message(role="user", content=user_text)
+            chat_ctx.add_message(role="assistant", content=agent_text)
+    chat_ctx.add_message(role="system", content="Fin de los ejemplos. La llamada real empieza ahora.")
+    return chat_ctx
+
+
+# Sales flow as tool results: the model gets one phase's guidance when it
+# enters that phase instead of re-reading the whole process every turn
+SalesPhase = Literal["situation", "problem", "implication", "value", "close"]
+CapitalBucket = Literal["<100", "100-1000", "1000-10000", ">10000"]
+
+_PHASE_GUIDANCE: Final[dict] = {
+    "situation": "10-15 segundos. Averiguá experiencia (principiante / intermedio / avanzado) "
+                 "y objetivo (aprender / ingresos extra / trading profesional).",
+    "problem": "Detectá frustraciones sin ser directo. Escuchá activamente y no interrumpas.",
+    "implication": "Agrandá el dolor sutilmente. Si aparecen objeciones, conectalas con soluciones M4Markets.",
+    "value": "Explicá forex SOLO si es principiante. Mencioná ventajas M4Markets según su perfil, "
+             "con datos: spreads, regulación, plataformas. Preguntá el capital y llamá record_capital.",
+    "close": "15-30 segundos. Cuenta demo si es principiante, cuenta real si tiene experiencia + capital. "
+             "SIEMPRE agendá el próximo paso.",
+}
+
+_CAPITAL_RECOMMENDATION: Final[dict] = {
+    "<100": "Cuenta Standard desde $5, o demo gratuita para practicar primero.",
+    "100-1000": "Cuenta Standard; Raw Spread si ya tiene experiencia (desde $100).",
+    "1000-10000": "Raw Spread account: spreads desde 0.0 pips, comisión $3 por lote por lado.",
+    ">10000": "Pro account: desde $10,000, spreads desde 0.0 pips, comisión $2 por lote por lado.",
+}
 
 
 class M4MarketsAgent(Agent):
@@ -24,296 +148,98 @@ class M4MarketsAgent(Agent):
     """
 
     def __init__(self) -> None:
-        super().__init__(
-            instructions="""
-            Sos Maicol, vendedor senior de M4Markets - Broker de Forex y CFDs.
-
-            TU VERDADERO OBJETIVO:
-            - Conectar emocionalmente con el prospecto
-            - Detectar sus frustraciones y deseos
-            - Posicionar M4Markets como LA solución
-            - Cerrar la cuenta (demo si es novato, real si tiene experiencia)
-
-            ═══════════════════════════════════════════════════════════════════
-            INFORMACION DE M4MARKETS
-            ═══════════════════════════════════════════════════════════════════
-
-            REGULACIONES:
-            - CySEC (Chipre): Licencia 301/16
-            - DFSA (Dubai): Licencia F007051
-            - FSA (Seychelles): Licencia SD047
-            - Fondos segregados, protección contra balance negativo
-
-            TIPOS DE CUENTA:
-            1. STANDARD ACCOUNT
-               - Deposito minimo: $5 USD
-               - Spreads: Desde 1.0 pip
-               - Comision: $0
-               - Ideal para: Principiantes
-
-            2. RAW SPREAD ACCOUNT
-               - Deposito minimo: $100 USD
-               - Spreads: Desde 0.0 pips
-               - Comision: $3 por lote por lado
-               - Ideal para: Traders experimentados
-
-            3. PRO ACCOUNT
-               - Deposito minimo: $10,000 USD
-               - Spreads: Desde 0.0 pips
-               - Comision: $2 por lote por lado
-               - Ideal para: Profesionales / Alto volumen
-
-            PLATAFORMAS:
-            - MetaTrader 4 (MT4)
-            - MetaTrader 5 (MT5)
-            - WebTrader (navegador)
-            - Apps móviles (iOS/Android)
-
-            INSTRUMENTOS:
-            - 60+ pares de divisas (Forex)
-            - Indices globales (US30, NAS100, etc.)
-            - Materias primas (Oro, Plata, Petroleo)
-            - Acciones CFDs
-            - Criptomonedas
-
-            ═══════════════════════════════════════════════════════════════════
-            METODOLOGÍA SPIN (adaptada para conversación natural)
-            ═══════════════════════════════════════════════════════════════════
-
-            FASE 1: SITUACIÓN (Entender contexto sin interrogar)
-
-            MAICOL: "Perfecto. Decime, ¿ya venís operando en Forex o esto es algo que te llama la atención pero no arrancaste todavía?"
-
-            Si opera:
-            MAICOL: "Ah mirá vos, ¿con qué broker estás ahora? ¿Cómo te está yendo con ellos?"
-
-            Si no opera:
-            MAICOL: "Buenísimo que quieras arrancar. ¿Qué es lo que más te interesa del trading? ¿Los ingresos extra, aprender algo nuevo...?"
-
-            ---
-
-            FASE 2: PROBLEMA (Detectar frustraciones SIN ser directo)
-
-            Preguntás con genuina curiosidad:
-            - "Y decime, ¿qué es lo que más te complica del trading?" (si opera)
-            - "¿Hay algo que te frene o te dé miedo de empezar?" (si no opera)
-            - "¿Tu broker actual te da dolores de cabeza con algo?" (si opera)
-
-            ESCUCHÁS ACTIVAMENTE:
-            - "Claro, entiendo perfectamente..."
-            - "Sí, eso lo escucho TODO el tiempo..."
-            - "Uf, te entiendo, a mí me pasaba lo mismo cuando empecé..."
-
-            ---
-
-            FASE 3: IMPLICACIÓN (Agrandar el dolor sutilmente)
-
-            NO preguntes directamente "¿cuánto perdés?"
-
-            HACELO ASÍ:
-            - "Y eso que me decís de los spreads altos, ¿te está afectando bastante en tus resultados?"
-            - "Imaginate si seguís así 6 meses más... ¿cómo te ves?"
-            - "Ese problema del broker, ¿hace cuánto que lo venís arrastrando?"
-
-            ---
-
-            FASE 4: VALOR (Que ELLOS digan por qué lo necesitan)
-
-            - "Si tuvieras un broker que resuelva eso, ¿cómo cambiaría tu situación?"
-            - "¿Qué significaría para vos poder operar con spreads desde 0.0 pips?"
-            - "Si pudieras arrancar hoy mismo con una cuenta real o demo, ¿qué elegirías?"
-
-            ═══════════════════════════════════════════════════════════════════
-            PROCESO DE VENTA
-            ═══════════════════════════════════════════════════════════════════
-
-            PASO 1: APERTURA (10-15 segundos)
-            - Saludo: "Hola, soy el asistente de M4Markets"
-            - Pregunta directa: "¿Actualmente operas en Forex o es algo nuevo para vos?"
-
-            PASO 2: CALIFICACION (30-60 segundos)
-            - Experiencia: Principiante / Intermedio / Avanzado
-            - Capital disponible: <$100 / $100-$1000 / $1000-$10000 / >$10000
-            - Objetivo: Aprender / Ingresos extra / Trading profesional
-
-            PASO 3: EDUCACION (60-90 segundos)
-            - Explica forex SOLO si es principiante
-            - Menciona ventajas M4Markets segun perfil
-            - Usa datos: spreads, regulacion, plataformas
-
-            PASO 4: OBJECIONES (30-60 segundos)
-            - Escucha activa
-            - No interrumpas
-            - Conecta objeciones con soluciones M4Markets
-
-            PASO 5: CIERRE (15-30 segundos)
-            - Cuenta demo si es principiante
-            - Cuenta real si tiene experiencia + capital
-            - SIEMPRE agenda proximo paso
-
-            ═══════════════════════════════════════════════════════════════════
-            REGLAS DE CONVERSACION
-            ═══════════════════════════════════════════════════════════════════
-
-            1. Se CONCISO: Respuestas de 15-30 segundos maximo
-            2. USA TU NOMBRE: "Como te mencioné antes..." (natural)
-            3. ESCUCHA ACTIVA: Deja que el prospecto hable
-            4. SIN TECH-SPEAK: Evita jerga, habla simple
-            5. CONFIRMA: "¿Tiene sentido?" "¿Esta claro?"
-            6. EDUCA, NO VENDAS: Posicionate como consultor
-
-            ═══════════════════════════════════════════════════════════════════
-            DISCLAIMERS IMPORTANTES
-            ═══════════════════════════════════════════════════════════════════
-
-            - NUNCA garantices retornos o ganancias
-            - SIEMPRE menciona: "Operar con CFDs implica riesgo significativo"
-            - Recomienda cuenta demo para principiantes
-            - Se transparente sobre costos y riesgos
-
-            ═══════════════════════════════════════════════════════════════════
-            EJEMPLO DE CONVERSACION
-            ═══════════════════════════════════════════════════════════════════
-
-            [APERTURA]
-            "Hola, soy el asistente de M4Markets. ¿Con quien tengo el gusto?"
+        super().__init__(instructions=_INSTRUCTIONS, chat_ctx=_example_context().copy())
+        self.phase: SalesPhase = "situation"
+        self.capital: Optional[CapitalBucket] = None
 
-            "Perfecto, Juan. ¿Actualmente operas en Forex o es algo nuevo para vos?"
+    @function_tool
+    async def set_phase(self, phase: SalesPhase) -> str:
+        """
+        Pasar a otra fase de la llamada.
 
-            [SI ES NUEVO]
-            "Genial que quieras empezar. Forex es el mercado de divisas, el mas grande del mundo.
-            ¿Te interesa como forma de ingresos extra o queres aprender a operar profesionalmente?"
+        Args:
+            phase: situation, problem, implication, value o close
+        """
+        logger.info("[M4Markets] Phase: %s -> %s", self.phase, phase)
+        self.phase = phase
+        return _PHASE_GUIDANCE[phase]
 
-            [SI OPERA]
-            "Perfecto. ¿Con que broker operas ahora? ¿Como te va con los spreads y comisiones?"
+    @function_tool
+    async def record_capital(self, bucket: CapitalBucket) -> str:
+        """
+        Registrar el capital aproximado del prospecto en USD.
 
-            [CALIFICACION]
-            "¿Cuanto capital aproximado pensas destinar al trading?"
+        Args:
+            bucket: <100, 100-1000, 1000-10000 o >10000
+        """
+        logger.info("[M4Markets] Capital: %s", bucket)
+        self.capital = bucket
+        return _CAPITAL_RECOMMENDATION[bucket]
 
-            [RECOMENDACION STANDARD]
-            "Basado en lo que me contas, te recomendaria nuestra cuenta Standard.
-            Podes empezar desde $5 USD, spreads competitivos desde 1.0 pip, y sin comisiones.
-            Es perfecta para arrancar. ¿Te gustaria que te ayude a abrirla?"
 
-            [RECOMENDACION RAW]
-            "Por tu experiencia y capital, te conviene nuestra Raw Spread account.
-            Spreads desde 0.0 pips, comision de $3 por lote. Ideal para scalping y day trading.
-            ¿Queres que veamos como abrirla?"
+def build_realtime_model() -> openai.realtime.RealtimeModel:
+    """Realtime model for the agent, with the per-response output token cap"""
+    # Using "shimmer" voice - more warm and conversational
+    model = openai.realtime.RealtimeModel(
+        model=SIMPLE_REALTIME_MODEL,
+        voice="shimmer",  # More natural, warm, conversational tone
+        modalities=["text", "audio"],
+    )
+    # Not a constructor argument; set through the session options instead
+    model.update_options(max_response_output_tokens=MAX_RESPONSE_TOKENS)
+    return model
 
-            [CIERRE DEMO]
-            "Si queres practicar primero, podes abrir una cuenta demo gratuita.
-            Te doy $10,000 virtuales para que pruebes sin riesgo. ¿Te parece?"
 
-            [CIERRE REAL]
-            "Perfecto. El proximo paso es abrir tu cuenta. Es 100% online, toma 5 minutos.
-            ¿Queres que te envie el link para registrarte?"
+def prewarm(proc: JobProcess):
+    """Build the realtime model once per worker process and share it across jobs."""
+    proc.userdata["greeting_audio"] = load_cached_audio(GREETING_AUDIO_PATH)
+    if proc.userdata["greeting_audio"] is None:
+        logger.warning("[M4Markets] No greeting audio at %s - greeting will be generated", GREETING_AUDIO_PATH)
 
-            ═══════════════════════════════════════════════════════════════════
-
-            IMPORTANTE:
-            - Habla en español argentino/LATAM
-            - Se profesional pero cercano
-            - No uses emojis en la voz
-            - Haz preguntas abiertas
-            - Conecta pain points con soluciones M4Markets
-            """
-        )
+    proc.userdata["llm"] = build_realtime_model()
 
 
 async def entrypoint(ctx: JobContext):
     """Voice sales agent entrypoint."""
 
-    logger.info(f"[M4Markets] Connecting to room: {ctx.room.name}")
+    logger.info("[M4Markets] Connecting to room: %s", ctx.room.name)
 
-    # Create agent session with Realtime model
-    # Using "shimmer" voice - more warm and conversational
-    session = agents.AgentSession(
-        llm=openai.realtime.RealtimeModel(
-            model="gpt-4o-realtime-preview-2024-12-17",  # Latest & most efficient
-            voice="shimmer",  # More natural, warm, conversational tone
-            temperature=0.9,  # Higher temperature for more variability
-            modalities=["text", "audio"],
-            instructions="""
-            Sos Maicol, un vendedor experto de M4Markets.
-
-            TONO Y ESTILO:
-            - Hablá con energía y entusiasmo genuino
-            - Usá pausas naturales entre ideas (no suenes robótico)
-            - Variá tu entonación - no hables monótono
-            - Mostrá empatía real - "Entiendo perfectamente..."  "Te entiendo..."
-            - Conversá, no recites - sé espontáneo
-
-            APERTURA:
-            "Hola, ¿cómo estás? Te habla Maicol de Em Four Markets. Vi que te registraste en nuestro sitio web
-            y que estás pensando en comenzar a invertir. Antes que nada, ¿podrías decirme...?"
-
-            IMPORTANTE PRONUNCIACIÓN:
-            - Siempre decí "Em Four Markets" (en inglés)
-            - NUNCA digas "M cuatro Markets" o "M4 Markets"
-
-            REGLAS DE CONVERSACIÓN:
-            1. NUNCA digas "como agente" o "soy un asistente" - sos Maicol, punto
-            2. Usá muletillas naturales: "mirá", "fijate", "te digo", "sabés qué"
-            3. Pausá entre frases - no hables todo de corrido
-            4. Mostrá reacciones: "Ah perfecto!", "Claro!", "Entiendo!", "Mirá qué bueno!"
-            5. Hacé preguntas de seguimiento naturales
-            6. NUNCA repitas la misma frase - variá SIEMPRE
-
-            EJEMPLOS DE VARIACIÓN:
-            - "¿Cómo estás?" / "¿Qué tal?" / "¿Todo bien?"
-            - "Perfecto" / "Genial" / "Buenísimo" / "Excelente"
-            - "Te entiendo" / "Totalmente" / "Claro que sí" / "Por supuesto"
-
-            EMPATÍA:
-            - "Entiendo perfectamente tu situación..."
-            - "Es totalmente normal sentirse así al principio..."
-            - "Muchos de nuestros mejores clientes empezaron exactamente como vos..."
-
-            CONEXIÓN:
-            - Detectá dolor: "¿Qué es lo que más te frustra de...?"
-            - Validá: "Eso que decís tiene todo el sentido..."
-            - Amplificá: "Y si seguís así, ¿cómo te ves en 6 meses?"
-
-            IMPORTANTE:
-            - Hablá como hablaría un vendedor top en una llamada real
-            - Conectá emocionalmente PRIMERO, vendé DESPUÉS
-            - Sé genuino, no suenes a script
-            """
-        )
-    )
+    # Create agent session with the realtime model built in prewarm
+    session = agents.AgentSession(llm=ctx.proc.userdata["llm"])
 
-    # Start the session
+    # Start the session (connects to the room as part of its startup)
     await session.start(
         room=ctx.room,
         agent=M4MarketsAgent()
     )
 
-    # Initial greeting - Natural and engaging
-    await session.generate_reply(
-        instructions="""
-        Hola! ¿Cómo estás? Te habla Maicol de Em Four Markets.
-
-        Vi que te registraste en nuestro sitio web y que estás pensando en comenzar a invertir.
-        Antes que nada, ¿podrías decirme si ya tenés alguna experiencia con trading o si esto es algo completamente nuevo para vos?
-
-        IMPORTANTE:
-        - Decí "Em Four Markets" (pronunciá en inglés, no en español)
-        - Soná genuinamente interesado y entusiasta
-        - No suenes robótico - variá la energía en tu voz
-        - Pausá naturalmente
-        - Mostrá que querés AYUDAR, no vender a toda costa
-        """
-    )
+    # Initial greeting - pre-rendered audio plays immediately and lands in the
+    # chat history, so the prompt's opener rule doesn't fire again; without it
+    # the model speaks that opener (no per-call instructions, so the cached
+    # prompt is all it needs)
+    greeting_audio = ctx.proc.userdata["greeting_audio"]
+    if greeting_audio:
+        await session.say(GREETING_TEXT, audio=iter_audio_frames(greeting_audio))
+    else:
+        await session.generate_reply()
 
     logger.info("[M4Markets] Agent ready and waiting for user response")
 
 
 if __name__ == "__main__":
+    missing = [name for name in _REQUIRED_ENV if not os.getenv(name)]
+    if missing:
+        logger.error("[M4Markets] Missing required environment variables: %s", ", ".join(missing))
+        sys.exit(1)
+
     cli.run_app(
         WorkerOptions(
             entrypoint_fnc=entrypoint,
-            api_key=os.getenv("LIVEKIT_API_KEY"),
-            api_secret=os.getenv("LIVEKIT_API_SECRET"),
-            ws_url=os.getenv("LIVEKIT_URL"),
+            prewarm_fnc=prewarm,
+            # NUM_IDLE_PROCESSES / JOB_MEMORY_WARN_MB, when set
+            **WORKER_TUNING,
+            api_key=LIVEKIT_API_KEY,
+            api_secret=LIVEKIT_API_SECRET,
+            ws_url=LIVEKIT_URL,
         )
     )